@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Embedding backend benchmark
+Compares load time, RSS, encode throughput and similarity fidelity of
+embedding model/backend pairs against the current BAAI/bge-m3 fp32 model.
+
+    uv run benchmarks/embedding_backends.py
+    uv run benchmarks/embedding_backends.py --models BAAI/bge-m3 BAAI/bge-small-en-v1.5 \
+        --backends torch torch-int8 onnx onnx-int8 --texts 512
+
+Each pair runs in a fresh subprocess so load time and RSS are not shared.
+Fidelity is the correlation of the pairwise similarity matrix with the
+baseline's (comparable across models), plus the mean cosine to the baseline
+embedding when the model is the same.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASELINE = ("BAAI/bge-m3", "torch")
+
+SUBJECTS = [
+    "a letter to the principal", "climate change", "the school library",
+    "a rainy day", "healthy eating habits", "a visit to the museum",
+    "online learning", "the importance of trees", "a science fair project",
+    "traffic rules", "festivals of India", "saving water",
+]
+TEMPLATES = [
+    "Write an essay about {}.",
+    "Describe your experience with {} in a short paragraph.",
+    "Speak for two minutes on {} and give examples.",
+    "Why is {} important for students? Explain with reasons.",
+    "Read the passage about {} and answer the questions that follow.",
+]
+
+
+def sample_texts(n: int) -> list:
+    texts = []
+    i = 0
+    while len(texts) < n:
+        subject = SUBJECTS[i % len(SUBJECTS)]
+        template = TEMPLATES[(i // len(SUBJECTS)) % len(TEMPLATES)]
+        texts.append(template.format(subject) + f" (variant {i})")
+        i += 1
+    return texts
+
+
+def run_worker(model_name: str, backend: str, n_texts: int, out_prefix: str):
+    """Measure one model/backend pair and save its embeddings"""
+    import numpy as np
+
+    from utils.allFunctions import load_embedding_model
+
+    texts = sample_texts(n_texts)
+
+    start = time.perf_counter()
+    model = load_embedding_model(model_name, backend)
+    load_seconds = time.perf_counter() - start
+    rss_after_load_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    model.encode(texts[:8], normalize_embeddings=True)  # warm-up
+    start = time.perf_counter()
+    embeddings = model.encode(texts, batch_size=32, normalize_embeddings=True)
+    encode_seconds = time.perf_counter() - start
+
+    np.save(out_prefix + ".npy", np.asarray(embeddings, dtype=np.float32))
+    with open(out_prefix + ".json", "w") as f:
+        json.dump(
+            {
+                "model": model_name,
+                "backend": backend,
+                "load_seconds": load_seconds,
+                "rss_after_load_mb": rss_after_load_mb,
+                "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                "texts_per_second": len(texts) / encode_seconds,
+                "dim": int(embeddings.shape[1]),
+            },
+            f,
+        )
+
+
+def fidelity(embeddings, baseline, same_model: bool) -> dict:
+    import numpy as np
+
+    sims = embeddings @ embeddings.T
+    base_sims = baseline @ baseline.T
+    upper = np.triu_indices_from(sims, k=1)
+    result = {
+        "similarity_corr": float(np.corrcoef(sims[upper], base_sims[upper])[0, 1])
+    }
+    if same_model:
+        result["mean_cosine_to_baseline"] = float(np.mean(np.sum(embeddings * baseline, axis=1)))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--models", nargs="+", default=[BASELINE[0]])
+    parser.add_argument(
+        "--backends", nargs="+", default=["torch", "torch-int8", "onnx", "onnx-int8"]
+    )
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--worker", nargs=3, metavar=("MODEL", "BACKEND", "OUT"))
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker[0], args.worker[1], args.texts, args.worker[2])
+        return
+
+    import numpy as np
+
+    pairs = [BASELINE] + [
+        (model, backend)
+        for model in args.models
+        for backend in args.backends
+        if (model, backend) != BASELINE
+    ]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (model, backend) in enumerate(pairs):
+            out = os.path.join(tmp, str(i))
+            proc = subprocess.run(
+                [sys.executable, __file__, "--texts", str(args.texts),
+                 "--worker", model, backend, out],
+                cwd=ROOT,
+                capture_output=True,
+                text=True,
+            )
+            if proc.returncode != 0:
+                print(f"⚠️ {model} [{backend}] failed:\n{proc.stderr.strip()[-800:]}")
+                continue
+            with open(out + ".json") as f:
+                result = json.load(f)
+            result["embeddings"] = np.load(out + ".npy")
+            results.append(result)
+
+    if not results or (results[0]["model"], results[0]["backend"]) != BASELINE:
+        print("❌ Baseline run failed; cannot compare fidelity")
+        sys.exit(1)
+
+    baseline = results[0]
+    header = (
+        f"{'model':<28} {'backend':<11} {'load s':>7} {'RSS MB':>8} "
+        f"{'texts/s':>8} {'sim corr':>9} {'cos':>6}"
+    )
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        score = fidelity(
+            result["embeddings"],
+            baseline["embeddings"],
+            result["model"] == baseline["model"],
+        )
+        cosine = score.get("mean_cosine_to_baseline")
+        print(
+            f"{result['model'][:28]:<28} {result['backend']:<11} "
+            f"{result['load_seconds']:>7.2f} {result['rss_after_load_mb']:>8.0f} "
+            f"{result['texts_per_second']:>8.1f} {score['similarity_corr']:>9.4f} "
+            f"{(f'{cosine:.4f}' if cosine is not None else '-'):>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
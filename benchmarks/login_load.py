@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Login rush benchmark
+Runs a burst of concurrent bcrypt verifications (what /auth/login does) and
+measures how late a cheap "other endpoint" coroutine gets scheduled while
+it is going on, with hashing inline on the event loop versus offloaded to
+utils.passwords' thread pool.
+
+    uv run benchmarks/login_load.py
+    uv run benchmarks/login_load.py --logins 200 --concurrency 50 --rounds 12
+
+Probe latency is the delay between when a 10 ms timer should fire and when
+the loop actually runs it. With hashing offloaded it should stay flat at
+the idle figure; inline it grows to whole bcrypt calls.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PROBE_INTERVAL = 0.01
+PASSWORD = "correct horse battery staple"
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def probe(stop: asyncio.Event, delays: list):
+    """Stand-in for a cheap endpoint: how late does the loop run us?"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        delays.append(max(0.0, loop.time() - expected))
+
+
+async def run(mode: str, password_hash: str, logins: int, concurrency: int) -> dict:
+    from passlib.hash import bcrypt
+
+    from utils import passwords
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with semaphore:
+            if mode == "inline":
+                ok = bcrypt.verify(PASSWORD, password_hash)
+                await asyncio.sleep(0)  # the handler's awaits around the verify
+            else:
+                ok = await passwords.verify_password(PASSWORD, password_hash)
+            assert ok
+
+    stop = asyncio.Event()
+    delays = []
+    probe_task = asyncio.create_task(probe(stop, delays))
+    await asyncio.sleep(0.2)  # idle baseline samples
+    idle = list(delays)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe_task
+
+    busy = delays[len(idle):] or [0.0]
+    return {
+        "mode": mode,
+        "logins_per_second": logins / elapsed,
+        "idle_p50_ms": statistics.median(idle or [0.0]) * 1000,
+        "busy_p50_ms": statistics.median(busy) * 1000,
+        "busy_p99_ms": percentile(busy, 99) * 1000,
+        "busy_max_ms": max(busy) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=None,
+                        help="bcrypt cost (defaults to BCRYPT_ROUNDS)")
+    args = parser.parse_args()
+
+    if args.rounds is not None:
+        os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    from utils import passwords
+
+    password_hash = asyncio.run(passwords.hash_password(PASSWORD))
+    print(
+        f"bcrypt rounds {passwords.BCRYPT_ROUNDS}, {passwords.PASSWORD_HASH_WORKERS} "
+        f"hash worker(s), {args.logins} logins at concurrency {args.concurrency}"
+    )
+
+    header = (
+        f"{'mode':<9} {'logins/s':>9} {'idle p50':>9} {'busy p50':>9} "
+        f"{'busy p99':>9} {'busy max':>9}   (probe delay, ms)"
+    )
+    print(header)
+    print("-" * len(header))
+    for mode in ("inline", "executor"):
+        result = asyncio.run(run(mode, password_hash, args.logins, args.concurrency))
+        print(
+            f"{result['mode']:<9} {result['logins_per_second']:>9.1f} "
+            f"{result['idle_p50_ms']:>9.2f} {result['busy_p50_ms']:>9.2f} "
+            f"{result['busy_p99_ms']:>9.2f} {result['busy_max_ms']:>9.2f}"
+        )
+    passwords.shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
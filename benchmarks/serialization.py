@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Response serialization benchmark
+Compares encode CPU and bytes on the wire for payloads shaped like our
+largest responses: FastAPI's default path (jsonable_encoder + json.dumps)
+versus utils.responses (orjson, MessagePack), each raw, gzipped and
+brotli-compressed.
+
+    uv run benchmarks/serialization.py
+    uv run benchmarks/serialization.py --repeat 200
+
+MessagePack and brotli rows appear when the `wire` extra is installed.
+"""
+
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bson import ObjectId  # noqa: E402
+
+random.seed(7)
+
+
+def words(n: int) -> str:
+    return " ".join(
+        "".join(random.choices(string.ascii_lowercase, k=random.randint(2, 9)))
+        for _ in range(n)
+    )
+
+
+def passages_page(size: int = 20) -> dict:
+    """GET /reading/passages: markdown passages"""
+    return {
+        "page": 1,
+        "page_size": size,
+        "total": 1200,
+        "results": [
+            {
+                "passage_id": str(ObjectId()),
+                "title": words(5).title(),
+                "level": random.choice(["beginner", "intermediate", "advanced"]),
+                "difficulty": random.choice(["easy", "medium", "hard"]),
+                "passage": "\n\n".join(f"**{words(3)}** {words(120)}" for _ in range(5)),
+            }
+            for _ in range(size)
+        ],
+    }
+
+
+def vocabulary_page(size: int = 50) -> dict:
+    """GET /vocabulary/: flashcards with ten example sentences each"""
+    return {
+        "page": 1,
+        "page_size": size,
+        "total": 8000,
+        "results": [
+            {
+                "word": words(1),
+                "meaning": words(12),
+                "when_to_use": words(20),
+                "example": [words(14).capitalize() + "." for _ in range(10)],
+            }
+            for _ in range(size)
+        ],
+    }
+
+
+def grammar_page(size: int = 200) -> dict:
+    """GET /grammar/questions: raw Mongo documents with ObjectIds"""
+    return {
+        "results": [
+            {
+                "_id": ObjectId(),
+                "id": str(ObjectId()),
+                "standard": random.randint(1, 12),
+                "topic": words(2),
+                "question_type": "mcq",
+                "level": "beginner",
+                "question": words(18) + "?",
+                "options": [words(2) for _ in range(4)],
+            }
+            for _ in range(size)
+        ],
+        "next_cursor": str(ObjectId()),
+    }
+
+
+def submission_detail(segments: int = 300) -> dict:
+    """GET /reading/passages/submissions/{id}: datetimes and float-heavy transcription"""
+    start = datetime.utcnow()
+    return {
+        "submission_id": str(ObjectId()),
+        "passage_id": str(ObjectId()),
+        "title": words(5),
+        "submitted_at": start,
+        "evaluation_data": {
+            "overall_score": 7.4,
+            "breakdown": {"accuracy": 7.9, "fluency": 6.8, "consistency": 7.5},
+            "feedback": [words(15) for _ in range(4)],
+        },
+        "transcription": [
+            {"text": words(6), "start": i * 1.37, "end": i * 1.37 + 1.2,
+             "confidence": random.random(), "at": start + timedelta(seconds=i)}
+            for i in range(segments)
+        ],
+    }
+
+
+PAYLOADS = {
+    "passages page": passages_page,
+    "vocabulary page": vocabulary_page,
+    "grammar questions": grammar_page,
+    "submission detail": submission_detail,
+}
+
+
+def encoders() -> dict:
+    found = {}
+    try:
+        from fastapi.encoders import jsonable_encoder
+
+        def fastapi_default(content):
+            # What fastapi.responses.JSONResponse does after jsonable_encoder
+            return json.dumps(
+                jsonable_encoder(content, custom_encoder={ObjectId: str}),
+                ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+            ).encode("utf-8")
+
+        found["fastapi json"] = fastapi_default
+    except ImportError:
+        found["stdlib json"] = lambda content: json.dumps(
+            content, default=str, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+    from utils import responses
+
+    found["orjson"] = responses.dumps
+    if responses.msgpack is not None:
+        found["msgpack"] = lambda content: responses.msgpack.packb(
+            content, default=responses._msgpack_default, use_bin_type=True
+        )
+    return found
+
+
+def timed(fn, arg, repeat: int):
+    """Mean microseconds per call, after one untimed warm-up call"""
+    # First call pays for lazy imports, compressor setup and cold caches
+    fn(arg)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(arg)
+    return result, (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    from utils import responses
+
+    compressors = {"gzip": lambda body: responses.compress(body, "gzip")}
+    if responses.brotli is not None:
+        compressors["br"] = lambda body: responses.compress(body, "br")
+
+    header = f"{'payload':<18} {'encoder':<13} {'encode µs':>10} {'bytes':>9}"
+    for name in compressors:
+        header += f" {name + ' bytes':>11} {name + ' µs':>9}"
+    print(header)
+    print("-" * len(header))
+
+    for payload_name, build in PAYLOADS.items():
+        payload = build()
+        for encoder_name, encode in encoders().items():
+            body, encode_us = timed(encode, payload, args.repeat)
+            row = f"{payload_name:<18} {encoder_name:<13} {encode_us:>10.0f} {len(body):>9}"
+            for compress in compressors.values():
+                compressed, compress_us = timed(compress, body, max(1, args.repeat // 5))
+                row += f" {len(compressed):>11} {compress_us:>9.0f}"
+            print(row)
+        print()
+
+
+if __name__ == "__main__":
+    main()
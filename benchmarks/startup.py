@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Startup budget check
+Times `import main` in a fresh interpreter, lists the slowest imports and
+fails when the budget is exceeded or a heavy module is imported eagerly.
+
+    uv run benchmarks/startup.py
+    uv run benchmarks/startup.py --budget 1.5 --runs 5 --top 25
+
+Heavy modules (torch, sentence-transformers, langgraph, ...) must only be
+imported on first use; importing one at startup is a regression even when
+the wall time is still within budget. Exits 1 on either failure so it can
+gate CI.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds allowed for `import main` (median over the runs)
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", 2.0))
+
+# Must not be in sys.modules right after `import main`
+FORBIDDEN_MODULES = [
+    "torch",
+    "sentence_transformers",
+    "transformers",
+    "sklearn",
+    "langgraph",
+    "langchain_openai",
+    "langchain_core",
+    "trustcall",
+    "mistralai",
+    "pdf2image",
+    "fitz",
+]
+
+PROBE = f"""
+import sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print("ELAPSED", elapsed)
+print("LOADED", ",".join(m for m in {FORBIDDEN_MODULES!r} if m in sys.modules))
+"""
+
+
+def run_probe(importtime: bool = False):
+    """Import main in a fresh interpreter; return (seconds, loaded, stderr)"""
+    env = dict(os.environ)
+    # config refuses to import without a key; startup never calls the API
+    env.setdefault("OPENAI_API_KEY", "startup-benchmark")
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    proc = subprocess.run(
+        cmd + ["-c", PROBE], cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        print(f"❌ import main failed:\n{proc.stderr.strip()[-1500:]}")
+        sys.exit(1)
+
+    elapsed, loaded = None, []
+    for line in proc.stdout.splitlines():
+        if line.startswith("ELAPSED "):
+            elapsed = float(line.split()[1])
+        elif line.startswith("LOADED "):
+            loaded = [m for m in line[len("LOADED "):].split(",") if m]
+    return elapsed, loaded, proc.stderr
+
+
+def slowest_imports(stderr: str, top: int) -> list:
+    """Parse -X importtime output into [(cumulative_us, self_us, module)]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+        except ValueError:
+            continue
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_SECONDS)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    # The first run warms the bytecode cache and provides the import profile
+    _, loaded, stderr = run_probe(importtime=True)
+    timings = [run_probe()[0] for _ in range(args.runs)]
+    median = statistics.median(timings)
+
+    print(f"{'cumulative ms':>13} {'self ms':>8}  module")
+    for cumulative_us, self_us, name in slowest_imports(stderr, args.top):
+        print(f"{cumulative_us / 1000:>13.1f} {self_us / 1000:>8.1f}  {name}")
+    print()
+    print(
+        f"import main: median {median:.3f}s over {args.runs} run(s) "
+        f"(min {min(timings):.3f}s, budget {args.budget:.2f}s)"
+    )
+
+    failed = False
+    if loaded:
+        print(f"❌ Heavy modules imported at startup: {', '.join(loaded)}")
+        failed = True
+    if median > args.budget:
+        print(f"❌ Startup over budget by {median - args.budget:.3f}s")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("✅ Startup within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,4 @@
 import os
-from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 load_dotenv()  # Load env variables once
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -9,8 +8,42 @@ MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
 if not OPENAI_API_KEY:
     raise ValueError("OPENAI_API_KEY is missing in .env")
 
-llm = ChatOpenAI(
-    api_key=OPENAI_API_KEY,
-    model=OPENAI_MODEL,
-    temperature=0.3
-)
\ No newline at end of file
+# Clients are built on first use: langchain and openai are slow to import
+# and most requests never touch them
+_llm = None
+_openai_client = None
+_async_openai_client = None
+
+
+def get_llm():
+    """Shared LangChain chat model"""
+    global _llm
+    if _llm is None:
+        from langchain_openai import ChatOpenAI
+
+        _llm = ChatOpenAI(
+            api_key=OPENAI_API_KEY,
+            model=OPENAI_MODEL,
+            temperature=0.3
+        )
+    return _llm
+
+
+def get_openai_client():
+    """Shared synchronous OpenAI client"""
+    global _openai_client
+    if _openai_client is None:
+        from openai import OpenAI
+
+        _openai_client = OpenAI(api_key=OPENAI_API_KEY)
+    return _openai_client
+
+
+def get_async_openai_client():
+    """Shared asynchronous OpenAI client"""
+    global _async_openai_client
+    if _async_openai_client is None:
+        from openai import AsyncOpenAI
+
+        _async_openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    return _async_openai_client
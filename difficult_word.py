@@ -1,19 +1,14 @@
 import os
 import json
 from typing import Dict
-from fastapi import FastAPI, UploadFile, HTTPException
 # from mistralai import Mistral
-from trustcall import create_extractor
-from langchain_openai import ChatOpenAI
 # from dotenv import load_dotenv
-import uvicorn
 from pydantic import BaseModel, Field
-import fitz
 import logging
 from typing import List, Dict
 import re
 import uuid
-from config import llm
+from config import get_llm
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
@@ -54,12 +49,21 @@ class WordsResponse(BaseModel):
 #     temperature=0.3
 # )
 
-# Create extractor with new schema
-extractor = create_extractor(
-    llm,
-    tools=[WordEntry],
-    tool_choice="WordEntry"
-)
+_extractor = None
+
+
+def get_extractor():
+    """Create the trustcall extractor with the new schema on first use"""
+    global _extractor
+    if _extractor is None:
+        from trustcall import create_extractor
+
+        _extractor = create_extractor(
+            get_llm(),
+            tools=[WordEntry],
+            tool_choice="WordEntry"
+        )
+    return _extractor
 
 def extract_difficult_words(text: str, standard: int = 1) -> WordsResponse:
 # def extract_difficult_words(text: str, grade: int = 1) -> list[str]:
@@ -75,7 +79,7 @@ def extract_difficult_words(text: str, standard: int = 1) -> WordsResponse:
         {"role": "user", "content": text}
     ]
 
-    result = llm.invoke(messages)
+    result = get_llm().invoke(messages)
     raw = result.content.strip()
 
     # 🚀 clean markdown fences if present
@@ -101,7 +105,7 @@ def expand_word_entries(words: List[str], standard: int) -> dict:
             "- meaning\n- when_to_use\n- exactly 10 example sentences"
         )
         messages = [{"role": "user", "content": prompt}]
-        result = extractor.invoke({"messages": messages})
+        result = get_extractor().invoke({"messages": messages})
         responses = result.get("responses")
 
         if isinstance(responses, list):
@@ -131,6 +135,8 @@ def expand_word_entries(words: List[str], standard: int) -> dict:
 
 def extract_text_from_pdf(pdf_path: str) -> str:
     """Extract text from PDF using PyMuPDF"""
+    import fitz
+
     text = ""
     try:
         with fitz.open(pdf_path) as doc:
@@ -1,5 +1,6 @@
 import os
 import uuid
+import random
 import logging
 from typing import List, Dict
 
@@ -7,13 +8,9 @@ from fastapi import FastAPI, HTTPException
 # from fastapi.concurrency import run_in_threadpool
 from fastapi import Body
 from pydantic import BaseModel, Field
-from pymongo import MongoClient
-from mongodb_client import MongoDBClient
-from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
-from config import OPENAI_API_KEY, OPENAI_MODEL, MONGO_URI
-from openai import OpenAI
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+from config import OPENAI_API_KEY, OPENAI_MODEL, get_openai_client
+from utils.minhash import NearDuplicateFilter
+from utils import answerKey
 
 
 # -------------------------
@@ -35,8 +32,6 @@ logging.basicConfig(level=logging.INFO)
 if not OPENAI_API_KEY:
     raise ValueError("OPENAI_API_KEY missing in environment")
 
-llm = ChatOpenAI(api_key=OPENAI_API_KEY, model=OPENAI_MODEL, temperature=0.3)
-
 
 class CurriculumEntry(BaseModel):
     standard: int
@@ -86,7 +81,7 @@ If options not required, return empty list [].
 
 def generate(state: State):
     prompt = build_prompt(state)    
-    response = openai_client.chat.completions.create(
+    response = get_openai_client().chat.completions.create(
         model=OPENAI_MODEL,
         messages=[{"role": "user", "content": prompt}],
         temperature=0.3,
@@ -146,12 +141,30 @@ def save_to_mongo(state: State):
             "options": q.get("options", []),
             "answer": q.get("answer"),
             "explanation": q.get("explanation"),
+            "rand": random.random(),  # random order for quiz sampling
         }
         records.append(record)
 
     if records:
         from main import app
-        app.state.mongodb_client.insert_documents("grammar_questions", records)
+        collection = app.state.mongodb_client.get_collection("grammar_questions")
+
+        # Skip questions (with their options and answer) that near-duplicate
+        # ones already stored for the same standard, topic and question type
+        records, duplicates = NearDuplicateFilter(
+            collection, ["question", "options", "answer"], "id"
+        ).filter(
+            records,
+            scope={
+                "standard": state["standard"],
+                "topic": state["topic"],
+                "question_type": state["question_type"],
+            },
+        )
+        if records:
+            app.state.mongodb_client.insert_documents("grammar_questions", records)
+            # insert_many filled in each record's _id
+            answerKey.add(records)
 
     return state  # Only return state for LangGraph
 
@@ -160,15 +173,25 @@ def save_to_mongo(state: State):
 # -------------------------
 # Build Graph
 # -------------------------
-graph = StateGraph(State)
-graph.add_node("generate", generate)
-graph.add_node("save", save_to_mongo)
+_app_graph = None
+
+
+def get_app_graph():
+    """Compile the generate -> save graph on first use (langgraph is slow to import)"""
+    global _app_graph
+    if _app_graph is None:
+        from langgraph.graph import StateGraph, END
+
+        graph = StateGraph(State)
+        graph.add_node("generate", generate)
+        graph.add_node("save", save_to_mongo)
 
-graph.set_entry_point("generate")
-graph.add_edge("generate", "save")
-graph.add_edge("save", END)
+        graph.set_entry_point("generate")
+        graph.add_edge("generate", "save")
+        graph.add_edge("save", END)
 
-app_graph = graph.compile()
+        _app_graph = graph.compile()
+    return _app_graph
 
 # -------------------------
 # FastAPI App
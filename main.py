@@ -1,27 +1,28 @@
 import tempfile
 from fastapi import FastAPI, UploadFile, File, HTTPException
-from mistralai import Mistral
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
 from dotenv import load_dotenv
 load_dotenv()  # Load env variables once
+import asyncio
 import logging
 import os
 from logging.handlers import RotatingFileHandler
 from story_generator import generate_story
-import uvicorn
-from pdf2image import convert_from_path
-import tempfile
 from difficult_word import extract_difficult_words, extract_text_from_pdf, expand_word_entries
 from fastapi import UploadFile, Form
 from typing import List
 from mongodb_client import MongoDBClient
 from contextlib import asynccontextmanager
-from grammar_question_answer import app_graph, CurriculumEntry
-from fastapi import Body
-from routers import auth, profile, dashboard, vocabulary, grammar, reading, writing, speaking
-from unseen_passage_generator import app_graph as unseen_passage_generator, PassageRequest
+from grammar_question_answer import get_app_graph as get_grammar_graph, CurriculumEntry
+from fastapi import Body, Depends
+from routers import auth, profile, dashboard, vocabulary, grammar, reading, writing, speaking, jobs
+from utils import idempotency, evaluationQueue, promptCache, vectorIndex, minhash, passwords, otp, answerKey, vocabularyIndex, submissions, contentVersion
+from utils.responses import ORJSONResponse, CompressionMiddleware, NegotiationMiddleware
+from database import db
+from utils.jwt import get_admin_user
+from unseen_passage_generator import get_app_graph as get_passage_graph, PassageRequest
 # from routes import router
 
 from fastapi import FastAPI
@@ -48,13 +49,32 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     app.state.mongodb_client = MongoDBClient()
+    minhash.ensure_indexes(app.state.mongodb_client)
+    await idempotency.ensure_indexes()
+    await otp.ensure_indexes()
+    await grammar.ensure_indexes()
+    await vocabulary.ensure_indexes()
+    await submissions.ensure_indexes()
+    await answerKey.load(db)
+    await vocabularyIndex.load(db)
+    await evaluationQueue.ensure_indexes()
+    await evaluationQueue.start()
+    # Index catalog documents created before the similarity index existed
+    # (one worker per host does it, once per embedding model)
+    backfill_task = asyncio.create_task(vectorIndex.backfill_once(db))
     try:
         yield
     finally:
+        backfill_task.cancel()
+        await evaluationQueue.stop()
+        reading.shutdown_score_pool()
+        passwords.shutdown_pool()
         app.state.mongodb_client.close_connection()
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 # app.include_router(router)
+app.add_middleware(NegotiationMiddleware)
+app.add_middleware(CompressionMiddleware)
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -91,6 +111,7 @@ app.include_router(grammar.router)
 app.include_router(reading.router)
 app.include_router(writing.router)
 app.include_router(speaking.router)
+app.include_router(jobs.router)
 
 @app.post("/api/education/story-generator")
 async def story_generator(request: StoryGeneratorRequest):
@@ -138,6 +159,8 @@ async def word_meaning(
     flashcards = expand_word_entries(words, standard)
 
     app.state.mongodb_client.insert_documents("vocabulary", flashcards["words"])
+    vocabularyIndex.add(flashcards["words"])
+    contentVersion.bump_sync(app.state.mongodb_client, "vocabulary")
     # app.state.mongodb_client.insert_flashcards(flashcards)
     # app.state.mongodb_client.collection.insert_many(flashcards["words"])
 
@@ -161,7 +184,7 @@ async def generate_all(curriculum: List[CurriculumEntry] = Body(...)):
                             "level": lvl,
                         }
                         print(state)
-                        state = app_graph.invoke(state)
+                        state = get_grammar_graph().invoke(state)
                         # app.state.mongodb_client.insert_documents("grammar_questions", state["questions"])
                         # # app.state.mongodb_client.collection.insert_many(records)
                         print("================================================")
@@ -184,12 +207,20 @@ async def generate_passage_endpoint(request: PassageRequest):
             "difficulty": request.difficulty,
             "length": request.length
         }
-        result = await unseen_passage_generator.ainvoke(state)
+        result = await get_passage_graph().ainvoke(state)
         return {"status": "success", "data": result}
     except Exception as e:
         logger.error(str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/education/prompt-cache-stats")
+async def prompt_cache_stats(admin_id: str = Depends(get_admin_user)):
+    """Prompt vs cached prompt tokens for the evaluation LLM calls"""
+    return promptCache.usage_stats()
+
+
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run("main:app", host="127.0.0.1", port=8004, reload=True)
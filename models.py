@@ -65,12 +65,37 @@ class EditProfile(BaseModel):
     # phone_or_email: Optional[str]
 
 
+# Vocabulary
+
+
+class VocabularyReview(BaseModel):
+    word_id: str
+    quality: int = Field(..., ge=0, le=5, description="0 = forgot, 5 = perfect recall")
+
+
+class VocabularyReviewBatch(BaseModel):
+    reviews: List[VocabularyReview] = Field(..., min_length=1, max_length=200)
+
+
 # Reading
 
 
 class GrammarAnswer(BaseModel):
     question_id: str
     answer: str
+    session_id: Optional[str] = None
+
+
+class GrammarBatchAnswer(BaseModel):
+    answers: List[GrammarAnswer] = Field(..., min_length=1, max_length=100)
+    session_id: Optional[str] = None
+
+
+class QuizSessionRequest(BaseModel):
+    standard: int
+    topic: str
+    level: str
+    size: int = Field(10, ge=1, le=50)
 
 
 class ReadingAnswer(BaseModel):
@@ -89,6 +114,16 @@ class ReadingEvaluation(BaseModel):
     audio_data: List[AudioSegment]
 
 
+class ReadingBatchItem(BaseModel):
+    user_id: str
+    passage_id: str
+    audio_data: List[AudioSegment]
+
+
+class ReadingBatchEvaluation(BaseModel):
+    items: List[ReadingBatchItem] = Field(..., min_length=1, max_length=100)
+
+
 # Writing
 
 
@@ -132,6 +167,14 @@ class SpeakingFeedback(BaseModel):
     areas_for_improvement: List[str]
 
 
+class SpeakingNarrativeFeedback(BaseModel):
+    pronunciation_score: float = Field(
+        ..., ge=0, le=10, description="Pronunciation score out of 10"
+    )
+    feedback: SpeakingFeedback
+    detailed_feedback: str = Field(..., description="Detailed feedback for improvement")
+
+
 class SpeakingLLMEvaluation(BaseModel):
     fluency_score: float = Field(
         ..., ge=0, le=10, description="Fluency score out of 10"
@@ -147,4 +190,6 @@ class SpeakingLLMEvaluation(BaseModel):
     )
     feedback: SpeakingFeedback
     detailed_feedback: str = Field(..., description="Detailed feedback for improvement")
-    example_response: str = Field(..., description="Example response for the topic")
+    example_response: Optional[str] = Field(
+        None, description="Example response for the topic (stored once per topic)"
+    )
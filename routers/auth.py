@@ -1,29 +1,38 @@
 # routers/auth.py
-from fastapi import APIRouter, HTTPException, Depends, Body
+from fastapi import APIRouter, HTTPException, Depends, Body, Request
 from models import UserRegister, UserLogin, OTPVerify, PhoneNumber, VerifyPhone
 from database import db
-from passlib.hash import bcrypt
-import random
-from datetime import datetime, timedelta
+from utils.passwords import hash_password, verify_password, needs_rehash
+from datetime import datetime
 from utils.jwt import create_access_token, get_current_user
+from utils.otp import issue_otp, verify_otp, client_ip, OTPThrottled, OTPInvalid
+from utils import profileCache
 from bson import ObjectId
 
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
+
+async def send_new_otp(phone, request: Request) -> str:
+    try:
+        return await issue_otp(phone, client_ip(request))
+    except OTPThrottled as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+async def consume_otp(phone, otp: str):
+    try:
+        return await verify_otp(phone, otp)
+    except OTPInvalid as e:
+        raise HTTPException(400, str(e))
+
 # Register
 @router.post("/register")
-async def verify_phone(phone: VerifyPhone):
-    existing = await db.users.find_one({"phone": phone.phone})
+async def verify_phone(phone: VerifyPhone, request: Request):
+    existing = await db.users.find_one({"phone": phone.phone}, {"_id": 1})
     if existing:
         raise HTTPException(400, "User already exists")
-    otp = str(random.randint(100000, 999999))
-    expires_at = datetime.utcnow() + timedelta(minutes=5)
-    existing = await db.otps.find_one({"phone": phone.phone})
-    if existing:
-        await db.otps.update_one({"phone": phone.phone}, {"$set": {"otp": otp, "expires_at": expires_at, "verified": False}})
-    else:
-        await db.otps.insert_one({"phone": phone.phone, "otp": otp, "expires_at": expires_at, "verified": False})
+    otp = await send_new_otp(phone.phone, request)
     return {"message": f"OTP sent to {phone.phone}", "otp": otp}  # remove otp in production
 
 # Register
@@ -39,15 +48,9 @@ async def register(user: UserRegister, otp: OTPVerify):
     if existing:
         raise HTTPException(400, "User already exists")
     
-    record = await db.otps.find_one({"phone": user.phone, "otp": otp.otp, "verified": False})
-    if not record:
-        raise HTTPException(400, "Invalid OTP")
-    if record["expires_at"] < datetime.utcnow():
-        raise HTTPException(400, "OTP expired")
-    await db.otps.update_one({"_id": record["_id"]}, {"$set": {"verified": True}})
-    await db.users.update_one({"phone": user.phone}, {"$set": {"is_phone_verified": True}})
-
-    hashed_password = bcrypt.hash(user.password)
+    await consume_otp(user.phone, otp.otp)
+
+    hashed_password = await hash_password(user.password)
     user_dict = user.dict()
     user_dict["password_hash"] = hashed_password
     user_dict.pop("password")
@@ -82,9 +85,16 @@ async def login(user: UserLogin):
             {"phone": {"$eq": user.phone_or_email, "$nin": [None, ""]}}
         ]
     })
-    if not existing or not bcrypt.verify(user.password, existing["password_hash"]):
+    if not existing or not await verify_password(user.password, existing.get("password_hash")):
         raise HTTPException(400, "Invalid credentials")
-    
+
+    # Upgrade hashes made with an older BCRYPT_ROUNDS while we have the password
+    if needs_rehash(existing["password_hash"]):
+        await db.users.update_one(
+            {"_id": existing["_id"]},
+            {"$set": {"password_hash": await hash_password(user.password)}}
+        )
+
     # ✅ Create JWT token
     token = create_access_token(str(existing["_id"]))
     del existing["password_hash"]
@@ -97,24 +107,22 @@ async def login(user: UserLogin):
 
 # Send OTP
 @router.post("/send-otp")
-async def send_otp(phone: VerifyPhone):
-    otp = str(random.randint(100000, 999999))
-    expires_at = datetime.utcnow() + timedelta(minutes=5)
-    # await db.otps.insert_one({"phone": phone.phone, "otp": otp, "expires_at": expires_at, "verified": False})
-    await db.otps.update_one({"phone": phone.phone}, {"$set": {"otp": otp, "expires_at": expires_at, "verified": False}})
+async def send_otp(phone: VerifyPhone, request: Request):
+    otp = await send_new_otp(phone.phone, request)
     return {"message": f"OTP sent to {phone.phone}", "otp": otp}  # remove otp in production
 
 # Confirm OTP
 @router.post("/confirm-otp")
 async def confirm_otp(data: OTPVerify):
-    record = await db.otps.find_one({"phone": data.phone, "otp": data.otp, "verified": False})
-    if not record:
-        raise HTTPException(400, "Invalid OTP")
-    if record["expires_at"] < datetime.utcnow():
-        raise HTTPException(400, "OTP expired")
-    await db.otps.update_one({"_id": record["_id"]}, {"$set": {"verified": True}})
-    await db.users.update_one({"phone": data.phone}, {"$set": {"is_phone_verified": True}})
-    user = await db.users.find_one({"phone": data.phone})
+    await consume_otp(data.phone, data.otp)
+    user = await db.users.find_one_and_update(
+        {"phone": data.phone},
+        {"$set": {"is_phone_verified": True}},
+        projection={"_id": 1},
+    )
+    if not user:
+        raise HTTPException(404, "User not found")
+    profileCache.invalidate(str(user["_id"]))
     token = create_access_token(str(user["_id"]))
     return {"message": "OTP verified successfully", "token": token}
 
@@ -122,6 +130,7 @@ async def confirm_otp(data: OTPVerify):
 async def update_password(password: str = Body(..., embed=True), user_id: str = Depends(get_current_user)):
     if not user_id:
         raise HTTPException(400, "User not found")
-    hashed_password = bcrypt.hash(password)
+    hashed_password = await hash_password(password)
     await db.users.update_one({"_id": ObjectId(user_id)}, {"$set": {"password_hash": hashed_password}})
+    profileCache.invalidate(user_id)
     return {"message": "Password updated successfully"}
\ No newline at end of file
@@ -1,36 +1,200 @@
 # routers/grammar.py
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 from database import db
-from models import GrammarAnswer
+from models import GrammarAnswer, GrammarBatchAnswer, QuizSessionRequest
 from bson import ObjectId
-from utils.jwt import get_current_user
-from datetime import datetime
+from bson.errors import InvalidId
+from utils.jwt import get_current_user, get_admin_user
+from utils import answerKey, responses
+from utils.answerKey import normalize_answer
+from datetime import datetime, timedelta
+from typing import Optional
+import os
+import random
+import uuid
 
 router = APIRouter(prefix="/grammar", tags=["Grammar"])
 
-# Get all questions
+MAX_PAGE_SIZE = 200
+EXPORT_BATCH_SIZE = 500
+
+# Students never see the answer key before answering
+STUDENT_PROJECTION = {"answer": 0, "explanation": 0, "minhash": 0, "minhash_bands": 0}
+EXPORT_PROJECTION = {"minhash": 0, "minhash_bands": 0}
+QUIZ_PROJECTION = {**STUDENT_PROJECTION, "rand": 0}
+
+# How long a quiz session can be answered against
+QUIZ_SESSION_TTL_SECONDS = int(os.getenv("QUIZ_SESSION_TTL_SECONDS", 2 * 60 * 60))
+
+
+async def ensure_indexes():
+    """Filters are equality matches followed by the _id paging cursor"""
+    await db.grammar_questions.create_index(
+        [("standard", 1), ("topic", 1), ("question_type", 1), ("level", 1), ("_id", 1)]
+    )
+    # Quiz sampling seeks into a random ordering per (standard, topic, level)
+    await db.grammar_questions.create_index(
+        [("standard", 1), ("topic", 1), ("level", 1), ("rand", 1)]
+    )
+    await db.grammar_questions.update_many(
+        {"rand": {"$exists": False}}, [{"$set": {"rand": {"$rand": {}}}}]
+    )
+    await db.grammar_answers.create_index([("user_id", 1), ("is_correct", 1)])
+    await db.quiz_sessions.create_index("session_id", unique=True)
+    await db.quiz_sessions.create_index("expires_at", expireAfterSeconds=0)
+
+
+def question_filter(standard=None, topic=None, question_type=None, level=None) -> dict:
+    filters = {
+        "standard": standard,
+        "topic": topic,
+        "question_type": question_type,
+        "level": level,
+    }
+    return {field: value for field, value in filters.items() if value is not None}
+
+
+# List questions, one page at a time
 @router.get("/questions")
-async def get_questions(user_id: str = Depends(get_current_user)):
-    questions = []
-    cursor = db.grammar_questions.find()
-    async for q in cursor:
-        q["_id"] = str(q["_id"])
-        questions.append(q)
+async def get_questions(
+    standard: Optional[int] = None,
+    topic: Optional[str] = None,
+    question_type: Optional[str] = None,
+    level: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    user_id: str = Depends(get_current_user)
+):
+    query = question_filter(standard, topic, question_type, level)
+    if cursor:
+        try:
+            query["_id"] = {"$gt": ObjectId(cursor)}
+        except InvalidId:
+            raise HTTPException(400, "Invalid cursor")
+
+    # One extra row tells us whether another page exists
+    questions = await db.grammar_questions.find(query, STUDENT_PROJECTION).sort(
+        "_id", 1
+    ).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(questions) > limit:
+        questions = questions[:limit]
+        next_cursor = str(questions[-1]["_id"])
+    # ObjectIds are serialized by the response class
+    return responses.render({"results": questions, "next_cursor": next_cursor})
+
+
+# Export questions with answers as NDJSON (admin only)
+@router.get("/questions/export")
+async def export_questions(
+    standard: Optional[int] = None,
+    topic: Optional[str] = None,
+    question_type: Optional[str] = None,
+    level: Optional[str] = None,
+    user_id: str = Depends(get_admin_user)
+):
+    query = question_filter(standard, topic, question_type, level)
+
+    async def lines():
+        # Streamed batch by batch; the full result is never held in memory
+        cursor = db.grammar_questions.find(query, EXPORT_PROJECTION).sort("_id", 1)
+        async for q in cursor.batch_size(EXPORT_BATCH_SIZE):
+            yield responses.dumps(q) + b"\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=grammar_questions.ndjson"},
+    )
+
+async def sample_questions(query: dict, size: int) -> list:
+    """
+    Pick `size` random questions matching the query with an indexed seek:
+    start at a random point of the `rand` ordering and wrap around once.
+    """
+    pivot = random.random()
+    questions = await db.grammar_questions.find(
+        {**query, "rand": {"$gte": pivot}}, QUIZ_PROJECTION
+    ).sort("rand", 1).limit(size).to_list(size)
+    if len(questions) < size:
+        remaining = size - len(questions)
+        questions += await db.grammar_questions.find(
+            {**query, "rand": {"$lt": pivot}}, QUIZ_PROJECTION
+        ).sort("rand", 1).limit(remaining).to_list(remaining)
+    random.shuffle(questions)
     return questions
 
+
+# Start a quiz: sample questions the user has not yet answered correctly
+@router.post("/quiz-sessions")
+async def create_quiz_session(request: QuizSessionRequest, user_id: str = Depends(get_current_user)):
+    answered = await db.grammar_answers.distinct(
+        "question_id", {"user_id": ObjectId(user_id), "is_correct": True}
+    )
+    query = {"standard": request.standard, "topic": request.topic, "level": request.level}
+    if answered:
+        query["_id"] = {"$nin": answered}
+
+    questions = await sample_questions(query, request.size)
+    if not questions:
+        raise HTTPException(404, "No unanswered questions for this topic and level")
+
+    for q in questions:
+        q["_id"] = str(q["_id"])
+    now = datetime.utcnow()
+    session = {
+        "session_id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "question_ids": [q["_id"] for q in questions],
+        "standard": request.standard,
+        "topic": request.topic,
+        "level": request.level,
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=QUIZ_SESSION_TTL_SECONDS),
+    }
+    await db.quiz_sessions.insert_one(session)
+    return {
+        "session_id": session["session_id"],
+        "expires_at": session["expires_at"],
+        "questions": questions,
+    }
+
+
+async def check_quiz_session(session_id: str, user_id: str, question_ids: list):
+    """Reject answers to questions that were not handed out in this session"""
+    session = await db.quiz_sessions.find_one(
+        {"session_id": session_id, "user_id": user_id}, {"_id": 0, "question_ids": 1}
+    )
+    if not session:
+        raise HTTPException(404, "Quiz session not found or expired")
+    unknown = set(question_ids) - set(session["question_ids"])
+    if unknown:
+        raise HTTPException(400, "Question is not part of this quiz session")
+
+
 # Verify answer
 @router.post("/verify")
 async def verify_answer(answer: GrammarAnswer, user_id: str = Depends(get_current_user)):
-    question = await db.grammar_questions.find_one({"_id": ObjectId(answer.question_id)})
-    if not question:
+    if answer.session_id:
+        await check_quiz_session(answer.session_id, user_id, [answer.question_id])
+    try:
+        question_id = ObjectId(answer.question_id)
+    except InvalidId:
+        raise HTTPException(400, "Invalid question_id")
+    key = await answerKey.get(db, answer.question_id)
+    if not key:
         raise HTTPException(404, "Question not found")
-    is_correct = question["answer"].lower().strip() == answer.answer.lower().strip()
+    expected, correct_answer, explanation = key
+    is_correct = expected == normalize_answer(answer.answer)
     # Save user answer
     await db.grammar_answers.insert_one({
         "user_id": ObjectId(user_id),
-        "question_id": ObjectId(answer.question_id),
+        "question_id": question_id,
         "answer": answer.answer,
-        "is_correct": is_correct
+        "is_correct": is_correct,
+        "session_id": answer.session_id
     })
 
     # ✅ Increment grammar_attempted in dashboard_usage
@@ -38,4 +202,51 @@ async def verify_answer(answer: GrammarAnswer, user_id: str = Depends(get_curren
         {"user_id": str(user_id)},
         {"$inc": {"grammar_attempted": 1}, "$set": {"last_active": datetime.utcnow()}}
     )
-    return {"question_id": answer.question_id, "correct": is_correct, "correct_answer": question["answer"],"explanation": question["explanation"]}
+    return {"question_id": answer.question_id, "correct": is_correct, "correct_answer": correct_answer,"explanation": explanation}
+
+
+# Verify a whole answer sheet in one request
+@router.post("/verify/batch")
+async def verify_answers(sheet: GrammarBatchAnswer, user_id: str = Depends(get_current_user)):
+    try:
+        question_ids = [ObjectId(a.question_id) for a in sheet.answers]
+    except InvalidId:
+        raise HTTPException(400, "Invalid question_id")
+    if sheet.session_id:
+        await check_quiz_session(sheet.session_id, user_id, [a.question_id for a in sheet.answers])
+
+    keys = await answerKey.get_many(db, [a.question_id for a in sheet.answers])
+
+    results, records = [], []
+    for answer, question_id in zip(sheet.answers, question_ids):
+        key = keys.get(answer.question_id)
+        if not key:
+            results.append({"question_id": answer.question_id, "error": "Question not found"})
+            continue
+        expected, correct_answer, explanation = key
+        is_correct = expected == normalize_answer(answer.answer)
+        records.append({
+            "user_id": ObjectId(user_id),
+            "question_id": question_id,
+            "answer": answer.answer,
+            "is_correct": is_correct,
+            "session_id": sheet.session_id
+        })
+        results.append({
+            "question_id": answer.question_id,
+            "correct": is_correct,
+            "correct_answer": correct_answer,
+            "explanation": explanation
+        })
+
+    if records:
+        await db.grammar_answers.insert_many(records, ordered=False)
+        await db.dashboard_usage.update_one(
+            {"user_id": str(user_id)},
+            {"$inc": {"grammar_attempted": len(records)}, "$set": {"last_active": datetime.utcnow()}}
+        )
+    return {
+        "total": len(records),
+        "correct": sum(1 for r in records if r["is_correct"]),
+        "results": results
+    }
@@ -0,0 +1,40 @@
+# routers/jobs.py
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, Query
+from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+from utils.jwt import get_current_user, verify_access_token
+from utils import evaluationQueue
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+# How long a websocket waits for a result before sending the current status
+WEBSOCKET_WAIT_SECONDS = 300
+
+
+# Get evaluation job status/result
+@router.get("/{job_id}")
+async def get_job(job_id: str, user_id: str = Depends(get_current_user)):
+    job = await evaluationQueue.get_job(job_id, user_id)
+    if not job:
+        return JSONResponse(status_code=404, content={"message": "Job not found"})
+    return job
+
+
+# Notify the client once the evaluation finishes
+@router.websocket("/{job_id}/ws")
+async def job_notifications(websocket: WebSocket, job_id: str, token: str = Query(...)):
+    user_id = verify_access_token(token)
+    if not user_id:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    try:
+        job = await evaluationQueue.wait_for(job_id, user_id, WEBSOCKET_WAIT_SECONDS)
+        if job is None:
+            await websocket.send_json({"job_id": job_id, "status": "not_found"})
+        else:
+            await websocket.send_json(jsonable_encoder(job))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
@@ -4,24 +4,27 @@ from models import EditProfile
 from database import db
 from bson import ObjectId
 from datetime import datetime
+from pymongo import ReturnDocument
 from utils.jwt import get_current_user
+from utils import profileCache
 
 router = APIRouter(prefix="/profile", tags=["Profile"])
 
 @router.get("")
-async def get_profile(user_id: str = Depends(get_current_user)):
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
-    if not user:
-        raise HTTPException(404, "User not found")
-    user["_id"] = str(user["_id"])
-    user.pop("password_hash", None)
-    return user
+async def get_profile(profile: dict = Depends(profileCache.current_profile)):
+    return profile
 
 @router.put("")
 async def edit_profile(profile: EditProfile, user_id: str = Depends(get_current_user)):
     update_data = {k: v for k, v in profile.dict().items() if v is not None}
     update_data["updated_at"] = datetime.utcnow()
-    result = await db.users.update_one({"_id": ObjectId(user_id)}, {"$set": update_data})
-    if result.modified_count == 0:
+    user = await db.users.find_one_and_update(
+        {"_id": ObjectId(user_id)},
+        {"$set": update_data},
+        projection=profileCache.PROFILE_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+    if not user:
         raise HTTPException(400, "Nothing to update")
+    profileCache.put(user_id, user)
     return {"message": "Profile updated successfully"}
@@ -1,21 +1,32 @@
 # routers/reading.py
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from database import db
-from models import ReadingAnswer, ReadingEvaluation, AudioSegment
+from models import ReadingAnswer, ReadingEvaluation, ReadingBatchEvaluation, AudioSegment
 from bson import ObjectId
-from utils.jwt import get_current_user
+from utils.jwt import get_current_user, get_admin_user
 from utils.allFunctions import AllFunctions
+from utils import vectorIndex, submissions, contentVersion, responses
 from typing import List, Optional
 from fastapi.responses import JSONResponse
+import asyncio
 import math
+import multiprocessing
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
 router = APIRouter(prefix="/reading", tags=["Reading"])
 
+# Worker processes used to score batch reading submissions
+READING_SCORE_WORKERS = int(os.getenv("READING_SCORE_WORKERS", os.cpu_count() or 2))
+_score_pool = None
+
 
 @router.get("/passages")
 async def get_passages_list(
+    request: Request,
+    response: Response,
     page: int,
     page_size: int,
     level_beginner: Optional[str] = Query(None, alias="level.beginner"),
@@ -24,6 +35,13 @@ async def get_passages_list(
     status: Optional[str] = Query(None),
     user_id: Optional[str] = Depends(get_current_user),
 ):
+    # Filtering by solved status makes the page depend on the user's submissions
+    versions = ["reading_passages"]
+    if status:
+        versions.append(contentVersion.user_key("reading_evaluations", user_id))
+    not_modified = await contentVersion.conditional(request, response, *versions)
+    if not_modified:
+        return not_modified
     try:
         # ───────────────────────────────────────────────
         #  Manual Filters + Pagination
@@ -129,12 +147,14 @@ async def get_passages_list(
                 "questions": 0,
                 "standard": 0,
                 "created_at": 0,
+                "minhash": 0,
+                "minhash_bands": 0,
             },
             page,
             page_size,
         )
 
-        return data
+        return responses.render(data, response)
 
     except Exception as e:
         return JSONResponse(
@@ -144,48 +164,67 @@ async def get_passages_list(
 
 
 @router.get("/passages/submissions")
-async def get_submissions(user_id: str = Depends(get_current_user)):
+async def get_submissions(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    user_id: str = Depends(get_current_user),
+):
+    """The user's submissions, newest first, as summaries (title, score, date)"""
     try:
-        # Fetch all submissions by user
-        submissions = await db.reading_evaluations.find(
-            {"user_id": user_id}, {"_id": 0, "user_id": 0, "transcription": 0}
-        ).to_list(None)
-
-        if not submissions:
-            return []
-
-        # Extract all passage_ids from submissions
-        passage_ids = [s["passage_id"] for s in submissions]
-
-        # Fetch passage details for these passage_ids
-        passages = await db.reading_passages.find(
-            {"passage_id": {"$in": passage_ids}},
-            {"_id": 0, "passage_id": 1, "title": 1},
-        ).to_list(None)
-
-        # Create a quick lookup map: {passage_id: title}
-        passage_map = {p["passage_id"]: p["title"] for p in passages}
-
-        # Append passage title to each submission
-        for sub in submissions:
-            sub["title"] = passage_map.get(sub["passage_id"], "Unknown Title")
-
-        return submissions
-
-    except Exception as e:
+        page = await submissions.list_submissions("reading_evaluations", user_id, cursor, limit)
+        return responses.render(page)
+    except submissions.InvalidCursor as e:
+        raise HTTPException(400, str(e))
+
+
+@router.get("/passages/submissions/{submission_id}")
+async def get_submission(submission_id: str, user_id: str = Depends(get_current_user)):
+    """One submission with its full evaluation_data"""
+    submission = await submissions.get_submission("reading_evaluations", user_id, submission_id)
+    if not submission:
+        raise HTTPException(404, "Submission not found")
+    return responses.render(submission)
+
+
+@router.get("/passages/similar/{passage_id}")
+async def get_similar_passages(
+    passage_id: str,
+    k: int = Query(5, ge=1, le=50),
+    level: Optional[str] = Query(None),
+    difficulty: Optional[str] = Query(None),
+    user_id: str = Depends(get_current_user),
+):
+    """Passages most similar to the given one, optionally filtered by level/difficulty"""
+    results = await vectorIndex.similar_documents(
+        db, "reading_passages", passage_id, k, level, difficulty
+    )
+    if results is None:
         return JSONResponse(
-            status_code=500,
-            content={"message": f"Server Error: {str(e)}"},
+            status_code=404,
+            content={"message": "Passage not found"},
         )
+    return results
 
 
 @router.get("/passages/{passage_id}")
-async def get_passages(passage_id: str, user_id: str = Depends(get_current_user)):
+async def get_passages(
+    request: Request, response: Response, passage_id: str, user_id: str = Depends(get_current_user)
+):
+    not_modified = await contentVersion.conditional(request, response, "reading_passages")
+    if not_modified:
+        return not_modified
     try:
         # Fetch passage (only one expected per passage_id)
         passage = await db.reading_passages.find_one(
             {"passage_id": passage_id},
-            {"_id": 0, "questions": 0, "standard": 0, "created_at": 0},
+            {
+                "_id": 0,
+                "questions": 0,
+                "standard": 0,
+                "created_at": 0,
+                "minhash": 0,
+                "minhash_bands": 0,
+            },
         )
         if not passage:
             return JSONResponse(
@@ -199,7 +238,7 @@ async def get_passages(passage_id: str, user_id: str = Depends(get_current_user)
             {"evaluation_data": 1},  # projection
         )
 
-        return passage
+        return responses.render(passage, response)
 
     except Exception as e:
 
@@ -231,19 +270,149 @@ async def evaluate_reading_skills(
         {
             "user_id": user_id,
             "passage_id": evaluation.passage_id,
+            "title": passage.get("title"),
             "evaluation_data": result,
             "transcription": [segment.dict() for segment in evaluation.audio_data],
             "submitted_at": datetime.utcnow(),
         }
     )
+    await contentVersion.bump(contentVersion.user_key("reading_evaluations", user_id))
 
     return result
 
 
+@router.post("/evaluate-reading/batch")
+async def evaluate_reading_batch(
+    batch: ReadingBatchEvaluation, user_id: str = Depends(get_admin_user)
+):
+    """
+    Evaluate a whole class's read-aloud recordings in one request (admins
+    only, since items are saved under other users' ids).
+    Passages are fetched with a single query, items are scored in parallel
+    across a process pool and all results are saved with one insert_many.
+    """
+    if not batch.items:
+        return []
+
+    # 1. Fetch every needed passage in one round trip
+    passage_ids = list({item.passage_id for item in batch.items})
+    passages = await db.reading_passages.find(
+        {"passage_id": {"$in": passage_ids}},
+        {"_id": 0, "passage_id": 1, "passage": 1, "title": 1},
+    ).to_list(None)
+    passage_map = {p["passage_id"]: p["passage"] for p in passages}
+    title_map = {p["passage_id"]: p.get("title") for p in passages}
+
+    # 2. Score items whose passage exists across the process pool
+    scorable = [item for item in batch.items if item.passage_id in passage_map]
+    jobs = [
+        (passage_map[item.passage_id], [segment.dict() for segment in item.audio_data])
+        for item in scorable
+    ]
+    scores = await score_reading_batch(jobs)
+    score_map = {id(item): score for item, score in zip(scorable, scores)}
+
+    # 3. Build per-item results and persist them with one unordered insert
+    submitted_at = datetime.utcnow()
+    results = []
+    records = []
+    for item in batch.items:
+        if id(item) not in score_map:
+            results.append(
+                {
+                    "user_id": item.user_id,
+                    "passage_id": item.passage_id,
+                    "error": "Passage not found",
+                }
+            )
+            continue
+
+        result = score_map[id(item)]
+        records.append(
+            {
+                "user_id": item.user_id,
+                "passage_id": item.passage_id,
+                "title": title_map[item.passage_id],
+                "evaluation_data": result,
+                "transcription": [segment.dict() for segment in item.audio_data],
+                "evaluated_by": user_id,
+                "submitted_at": submitted_at,
+            }
+        )
+        results.append(
+            {"user_id": item.user_id, "passage_id": item.passage_id, "result": result}
+        )
+
+    if records:
+        await db.reading_evaluations.insert_many(records, ordered=False)
+        await contentVersion.bump(
+            *{contentVersion.user_key("reading_evaluations", r["user_id"]) for r in records}
+        )
+
+    return results
+
+
+def get_score_pool():
+    """Return the process pool used for batch reading scoring (created lazily)"""
+    global _score_pool
+    if _score_pool is None:
+        # Never fork this process: it already runs motor, the bcrypt pool
+        # and torch threads, whose locks a forked child would inherit
+        method = (
+            "forkserver"
+            if "forkserver" in multiprocessing.get_all_start_methods()
+            else "spawn"
+        )
+        _score_pool = ProcessPoolExecutor(
+            max_workers=READING_SCORE_WORKERS,
+            mp_context=multiprocessing.get_context(method),
+        )
+    return _score_pool
+
+
+def shutdown_score_pool():
+    """Shut down the batch scoring pool, if it was started"""
+    global _score_pool
+    if _score_pool is not None:
+        _score_pool.shutdown(wait=False, cancel_futures=True)
+        _score_pool = None
+
+
+async def score_reading_batch(jobs):
+    """
+    Score (passage_text, segments) pairs in parallel.
+    Jobs are split into one chunk per worker to keep IPC overhead low.
+    """
+    if not jobs:
+        return []
+
+    chunk_size = math.ceil(len(jobs) / READING_SCORE_WORKERS)
+    chunks = [jobs[i : i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+
+    loop = asyncio.get_running_loop()
+    pool = get_score_pool()
+    scored_chunks = await asyncio.gather(
+        *[loop.run_in_executor(pool, score_reading_chunk, chunk) for chunk in chunks]
+    )
+    return [result for chunk in scored_chunks for result in chunk]
+
+
+def score_reading_chunk(jobs):
+    """Score a chunk of (passage_text, segments) pairs inside a pool worker"""
+    return [score_reading({"passage": text}, segments) for text, segments in jobs]
+
+
 async def evaluate_reading_skills_internal(passage, audio_data):
     """
     Internal function to evaluate reading skills
     """
+    return score_reading(passage, audio_data)
+
+
+def score_reading(passage, audio_data):
+    """
+    Score reading skills synchronously (safe to run in a worker process)
+    """
     # Input validation
     if not audio_data or len(audio_data) == 0:
         return get_empty_evaluation_result("No audio data provided")
@@ -1,21 +1,33 @@
 # routers/speaking.py
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Header, BackgroundTasks, Request, Response
 from database import db
 from models import (
     SpeakingTopic,
     SpeakingVerificationRequest,
     SpeakingLLMEvaluation,
+    SpeakingNarrativeFeedback,
 )
+from routers.reading import evaluate_consistency
 from datetime import datetime
 from utils.jwt import get_current_user
 import uuid
+import asyncio
 from utils.allFunctions import AllFunctions
+from utils import idempotency, evaluationQueue, promptCache, vectorIndex, submissions, contentVersion, responses
+from utils.evaluationQueue import EvaluationError
 from typing import Optional
 from fastapi.responses import JSONResponse
-from openai import AsyncOpenAI
-
-# Initialize OpenAI client
-client = AsyncOpenAI()
+from fastapi.concurrency import run_in_threadpool
+from config import get_async_openai_client
+import os
+
+# Smaller model used only for the narrative feedback
+SPEAKING_FEEDBACK_MODEL = os.getenv("SPEAKING_FEEDBACK_MODEL", "gpt-4o-mini")
+# Topic/transcript similarity mapped to a 0-10 relevance score between these bounds
+RELEVANCE_FLOOR = float(os.getenv("SPEAKING_RELEVANCE_FLOOR", 0.3))
+RELEVANCE_CEILING = float(os.getenv("SPEAKING_RELEVANCE_CEILING", 0.75))
+# Comfortable speaking pace for students; SPEAKING_RUBRIC quotes the same band
+SPEAKING_PACE_WPM = (110, 160)
 
 router = APIRouter(prefix="/speaking", tags=["Speaking"])
 
@@ -23,6 +35,8 @@ router = APIRouter(prefix="/speaking", tags=["Speaking"])
 # Get writing topics
 @router.get("/topics")
 async def get_topics(
+    request: Request,
+    response: Response,
     page: int,
     page_size: int,
     level_beginner: Optional[str] = Query(None, alias="level.beginner"),
@@ -31,6 +45,13 @@ async def get_topics(
     status: Optional[str] = Query(None),
     user_id: Optional[str] = Depends(get_current_user),
 ):
+    # Filtering by solved status makes the page depend on the user's submissions
+    versions = ["speaking_topics"]
+    if status:
+        versions.append(contentVersion.user_key("speaking_evaluations", user_id))
+    not_modified = await contentVersion.conditional(request, response, *versions)
+    if not_modified:
+        return not_modified
     try:
         # Build base query with AND relationship
         query = {}
@@ -132,12 +153,13 @@ async def get_topics(
             {
                 "_id": 0,
                 "created_at": 0,
+                "example_response": 0,
             },
             page,
             page_size,
         )
 
-        return data
+        return responses.render(data, response)
 
     except Exception as e:
         return JSONResponse(
@@ -147,7 +169,7 @@ async def get_topics(
 
 
 @router.post("/topics")
-async def add_topic(topic: SpeakingTopic):
+async def add_topic(topic: SpeakingTopic, background_tasks: BackgroundTasks):
     topic_doc = {
         "topic_id": str(uuid.uuid4()),  # generate UUID
         "title": topic.title,
@@ -158,53 +180,69 @@ async def add_topic(topic: SpeakingTopic):
     }
 
     result = await db.speaking_topics.insert_one(topic_doc)
-    return {**topic_doc, "_id": str(result.inserted_id)}
+    await contentVersion.bump("speaking_topics")
+    response = {**topic_doc, "_id": str(result.inserted_id)}
+
+    # Index the topic and generate the model response once, off the request path
+    # Index first: a failed LLM call stops the tasks queued after it
+    background_tasks.add_task(vectorIndex.index_in_background, "speaking_topics", topic_doc)
+    background_tasks.add_task(get_example_response, topic_doc)
+    return response
 
 
 @router.get("/topics/submissions")
-async def get_submissions(user_id: str = Depends(get_current_user)):
+async def get_submissions(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    user_id: str = Depends(get_current_user),
+):
+    """The user's submissions, newest first, as summaries (title, score, date)"""
     try:
-        # Fetch all submissions by user
-        submissions = await db.speaking_evaluations.find(
-            {"user_id": user_id}, {"_id": 0, "user_id": 0, "transcription": 0}
-        ).to_list(None)
-
-        if not submissions:
-            return []
-
-        # Extract all topic_ids from submissions
-        topics_ids = [s["topic_id"] for s in submissions]
-
-        # Fetch passage details for these passage_ids
-        topics = await db.speaking_topics.find(
-            {"topic_id": {"$in": topics_ids}},
-            {"_id": 0, "topic_id": 1, "title": 1},
-        ).to_list(None)
-
-        # Create a quick lookup map: {topic_id: title}
-        topic_map = {t["topic_id"]: t["title"] for t in topics}
-
-        # Append title to each submission
-        for sub in submissions:
-            sub["title"] = topic_map.get(sub["topic_id"], "Unknown Title")
-
-        return submissions
-
-    except Exception as e:
-        return JSONResponse(
-            status_code=500,
-            content={"message": f"Server Error: {str(e)}"},
-        )
+        page = await submissions.list_submissions("speaking_evaluations", user_id, cursor, limit)
+        return responses.render(page)
+    except submissions.InvalidCursor as e:
+        raise HTTPException(400, str(e))
+
+
+@router.get("/topics/submissions/{submission_id}")
+async def get_submission(submission_id: str, user_id: str = Depends(get_current_user)):
+    """One submission with its full evaluation_data"""
+    submission = await submissions.get_submission("speaking_evaluations", user_id, submission_id)
+    if not submission:
+        raise HTTPException(404, "Submission not found")
+    return responses.render(submission)
+
+
+@router.get("/topics/similar/{topic_id}")
+async def get_similar_topics(
+    topic_id: str,
+    k: int = Query(5, ge=1, le=50),
+    level: Optional[str] = Query(None),
+    difficulty: Optional[str] = Query(None),
+    user_id: str = Depends(get_current_user),
+):
+    """Topics most similar to the given one, optionally filtered by level/difficulty"""
+    results = await vectorIndex.similar_documents(
+        db, "speaking_topics", topic_id, k, level, difficulty
+    )
+    if results is None:
+        return JSONResponse(status_code=404, content={"message": "Topic not found"})
+    return results
 
 
 # Get speaking topics
 @router.get("/topics/{topic_id}")
-async def get_topic(topic_id: str, user_id: str = Depends(get_current_user)):
+async def get_topic(
+    request: Request, response: Response, topic_id: str, user_id: str = Depends(get_current_user)
+):
+    not_modified = await contentVersion.conditional(request, response, "speaking_topics")
+    if not_modified:
+        return not_modified
     try:
         # Fetch topic (only one expected per topic_id)
         topic = await db.speaking_topics.find_one(
             {"topic_id": topic_id},
-            {"_id": 0, "created_at": 0},
+            {"_id": 0, "created_at": 0, "example_response": 0},
         )
         if not topic:
             return JSONResponse(
@@ -212,7 +250,7 @@ async def get_topic(topic_id: str, user_id: str = Depends(get_current_user)):
                 content={"message": "Topic not found"},
             )
 
-        return topic
+        return responses.render(topic, response)
 
     except Exception as e:
 
@@ -224,110 +262,380 @@ async def get_topic(topic_id: str, user_id: str = Depends(get_current_user)):
 
 @router.post("/verify")
 async def verify_speaking(
-    request: SpeakingVerificationRequest, user_id: str = Depends(get_current_user)
+    request: SpeakingVerificationRequest,
+    user_id: str = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    mode: str = Query("full", pattern="^(full|instant)$"),
 ):
     """
-    Evaluate speaking skills based on transcription data using LLM
+    Evaluate speaking skills based on transcription data.
+    Fluency and content relevance are scored locally; the LLM only writes the
+    narrative feedback. With mode=instant the numeric scores are returned
+    right away (202) and the feedback is delivered through the job queue.
     """
+    if mode == "instant":
+        return await verify_speaking_instant(request, user_id)
+
+    # Return an in-flight or completed evaluation instead of running it again
+    full_text = " ".join([segment.text for segment in request.transcription])
+    key = idempotency.request_key(
+        "speaking", user_id, request.topic_id, full_text, idempotency_key
+    )
     try:
-        # Verify topic exists
-        topic = await db.speaking_topics.find_one(
-            {"topic_id": request.topic_id}, {"_id": 0, "created_at": 0}
+        stored = await idempotency.claim(
+            key, idempotency.payload_hash(user_id, request.topic_id, full_text)
+        )
+    except idempotency.EvaluationInProgress:
+        return JSONResponse(
+            status_code=409,
+            content={"message": "Evaluation already in progress, retry shortly."},
         )
+    except idempotency.IdempotencyKeyReused:
+        return JSONResponse(
+            status_code=422,
+            content={"message": "Idempotency-Key was already used for a different submission."},
+        )
+    if stored is not None:
+        return stored
 
-        if not topic:
-            return JSONResponse(status_code=404, content={"message": "Topic not found"})
+    try:
+        result = await run_speaking_evaluation(request, user_id)
+    except EvaluationError as e:
+        await idempotency.release(key)
+        return JSONResponse(status_code=e.status_code, content={"message": e.message})
+    except Exception as e:
+        await idempotency.release(key)
+        return JSONResponse(
+            status_code=500,
+            content={"message": f"An error occurred during evaluation: {str(e)}"},
+        )
+
+    await idempotency.complete(key, result)
+    return result
+
+
+@router.post("/verify/async", status_code=202)
+async def verify_speaking_async(
+    request: SpeakingVerificationRequest, user_id: str = Depends(get_current_user)
+):
+    """
+    Queue a speaking evaluation and return immediately with a job id.
+    Poll GET /jobs/{job_id} or listen on /jobs/{job_id}/ws for the result.
+    """
+    job_id = await evaluationQueue.submit("speaking", user_id, request.dict())
+    return {"job_id": job_id, "status": "queued"}
 
-        # Combine transcription text
-        full_text = " ".join([segment.text for segment in request.transcription])
 
-        # Calculate speaking metrics
-        total_time = max([segment.endTime for segment in request.transcription]) - min(
-            [segment.startTime for segment in request.transcription]
+async def verify_speaking_instant(request: SpeakingVerificationRequest, user_id: str):
+    """Return local scores immediately and queue the narrative feedback"""
+    topic = await get_speaking_topic(request.topic_id)
+    if not topic:
+        return JSONResponse(status_code=404, content={"message": "Topic not found"})
+
+    try:
+        scores = await compute_local_scores(topic, request.transcription)
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"message": f"An error occurred during evaluation: {str(e)}"},
         )
-        word_count = len(full_text.split())
-        wpm = (word_count / total_time) * 60 if total_time > 0 else 0
 
-        # Build LLM evaluation prompt
-        prompt = f"""
-You are an expert English speaking skills evaluator. Evaluate the student's speaking performance based on the transcription data.
+    job_id = await evaluationQueue.submit(
+        "speaking", user_id, {**request.dict(), "local_scores": scores}
+    )
+    return JSONResponse(
+        status_code=202,
+        content={**scores, "job_id": job_id, "status": "queued"},
+    )
 
-Topic Details:
-Title: {topic.get('title', 'N/A')}
-Description: {topic.get('description', 'N/A')}
-Level: {topic.get('level', 'N/A')}
-Difficulty: {topic.get('difficulty', 'N/A')}
 
-Student's Spoken Response:
-"{full_text}"
+async def get_speaking_topic(topic_id: str):
+    return await db.speaking_topics.find_one(
+        {"topic_id": topic_id}, {"_id": 0, "created_at": 0}
+    )
+
+
+def evaluate_speaking_fluency(segments: list) -> dict:
+    """
+    Speaking fluency (4 points): pace (2) and pauses between segments (2).
+    Pace is words over the whole response span, the figure the LLM prompt
+    shows too. A single segment has no measurable pauses, so it is scored
+    on pace alone.
+    """
+    segments = [seg for seg in segments if seg["text"].strip()]
+    if not segments:
+        return {"score": 0, "words_per_minute": 0, "average_pause": 0,
+                "total_time": 0, "word_count": 0}
+
+    total_time = max(seg["endTime"] for seg in segments) - min(
+        seg["startTime"] for seg in segments
+    )
+    word_count = sum(len(seg["text"].split()) for seg in segments)
+    words_per_minute = word_count / total_time * 60 if total_time > 0 else 0
+
+    low, high = SPEAKING_PACE_WPM
+    if low <= words_per_minute <= high:
+        pace_score = 2
+    elif low - 20 <= words_per_minute <= high + 20:
+        pace_score = 1.5
+    elif low - 40 <= words_per_minute <= high + 40:
+        pace_score = 1
+    else:
+        pace_score = 0.5
+
+    pauses = [
+        segments[i]["startTime"] - segments[i - 1]["endTime"]
+        for i in range(1, len(segments))
+        if segments[i]["startTime"] > segments[i - 1]["endTime"]
+    ]
+    average_pause = sum(pauses) / len(pauses) if pauses else 0
+    if len(segments) < 2:
+        pause_score = pace_score
+    elif average_pause <= 0.3:
+        pause_score = 2
+    elif average_pause <= 0.6:
+        pause_score = 1.5
+    elif average_pause <= 1.0:
+        pause_score = 1
+    elif average_pause <= 1.5:
+        pause_score = 0.5
+    else:
+        pause_score = 0.2
+
+    return {
+        "score": pace_score + pause_score,
+        "words_per_minute": words_per_minute,
+        "average_pause": average_pause,
+        "total_time": total_time,
+        "word_count": word_count,
+    }
+
+
+async def compute_local_scores(topic: dict, transcription) -> dict:
+    """
+    Score fluency and content relevance without the LLM.
+    Fluency is pace and pauses plus the reading pacing consistency metric;
+    relevance is the embedding similarity between the topic and the transcript.
+    """
+    segments = [segment.dict() for segment in transcription]
+    full_text = " ".join([segment["text"] for segment in segments])
+
+    # Fluency: pace and pauses (4 pts) + pacing consistency (2 pts) scaled to 10
+    fluency = evaluate_speaking_fluency(segments)
+    consistency = evaluate_consistency(segments)
+    fluency_score = (fluency["score"] + consistency["score"]) / 6 * 10
+
+    # Content relevance: topic vs transcript similarity mapped onto 0-10
+    topic_text = f"{topic.get('title', '')}. {topic.get('description', '')}"
+    # Only the topic text goes into the embedding cache; transcripts are one-off
+    similarity = await run_in_threadpool(
+        AllFunctions().get_similarity_score, topic_text, full_text, False
+    )
+    relevance = (similarity - RELEVANCE_FLOOR) / (RELEVANCE_CEILING - RELEVANCE_FLOOR)
+    relevance_score = min(max(relevance, 0), 1) * 10
+
+    return {
+        "fluency_score": round(fluency_score, 1),
+        "content_relevance_score": round(relevance_score, 1),
+        "metrics": {
+            "words_per_minute": round(fluency["words_per_minute"], 1),
+            "average_pause": round(fluency["average_pause"], 2),
+            "total_time": round(fluency["total_time"], 1),
+            "word_count": fluency["word_count"],
+            "pacing_variation": round(consistency["consistency"], 3),
+            "topic_similarity": round(similarity, 3),
+        },
+    }
+
+
+async def run_speaking_evaluation(
+    request: SpeakingVerificationRequest, user_id: str, local_scores: dict = None
+):
+    """
+    Evaluate a speaking transcription and save the result.
+    Raises EvaluationError when the topic or the evaluator output is invalid.
+    """
+    # Verify topic exists
+    topic = await get_speaking_topic(request.topic_id)
+
+    if not topic:
+        raise EvaluationError(404, "Topic not found")
+
+    # Deterministic scores first, so the feedback can refer to them
+    if local_scores is None:
+        local_scores = await compute_local_scores(topic, request.transcription)
+
+    # Build LLM feedback prompt
+    messages = build_speaking_messages(topic, request.transcription, local_scores)
+
+    # Call OpenAI model (the topic's example response is generated only once)
+    llm_response, example_response = await asyncio.gather(
+        get_async_openai_client().chat.completions.create(
+            model=SPEAKING_FEEDBACK_MODEL,
+            messages=messages,
+            response_format={"type": "json_object"},
+        ),
+        get_example_response(topic),
+    )
+    promptCache.record_usage("speaking", llm_response.usage)
+
+    # Parse response safely
+    try:
+        content = llm_response.choices[0].message.content
+        narrative = SpeakingNarrativeFeedback.parse_raw(content)
+    except Exception:
+        raise EvaluationError(500, "Invalid response format from evaluator.")
+
+    overall_score = (
+        local_scores["fluency_score"]
+        + narrative.pronunciation_score
+        + local_scores["content_relevance_score"]
+    ) / 3
+    evaluation = SpeakingLLMEvaluation(
+        fluency_score=local_scores["fluency_score"],
+        pronunciation_score=narrative.pronunciation_score,
+        content_relevance_score=local_scores["content_relevance_score"],
+        overall_score=round(overall_score, 1),
+        feedback=narrative.feedback,
+        detailed_feedback=narrative.detailed_feedback,
+        example_response=example_response,
+    )
+
+    # Store evaluation in database
+    evaluation_doc = {
+        "user_id": user_id,
+        "topic_id": request.topic_id,
+        "title": topic.get("title"),
+        "evaluation_data": evaluation.dict(),
+        "transcription": [segment.dict() for segment in request.transcription],
+        "submitted_at": datetime.utcnow(),
+    }
+
+    await db.speaking_evaluations.insert_one(evaluation_doc)
+    await contentVersion.bump(contentVersion.user_key("speaking_evaluations", user_id))
+
+    return evaluation.dict()
+
+
+async def process_speaking_job(user_id: str, payload: dict):
+    """Evaluation queue handler for speaking submissions"""
+    return await run_speaking_evaluation(
+        SpeakingVerificationRequest(**payload), user_id, payload.get("local_scores")
+    )
+
+
+evaluationQueue.register_handler("speaking", process_speaking_job)
 
-Speaking Metrics:
-- Words per minute: {wpm:.1f}
-- Total speaking time: {total_time:.1f} seconds
-- Word count: {word_count}
 
-Evaluation Criteria:
-1. Fluency (0-10): Speaking pace, rhythm, natural flow, pauses
-2. Pronunciation (0-10): Clarity, accuracy of sounds, word stress
-3. Content Relevance (0-10): How well the response addresses the topic
-4. Overall Score (0-10): Overall speaking performance
+# Static rubric sent first so every request shares the same cacheable prefix.
+# The pace band matches SPEAKING_PACE_WPM used by the fluency score.
+SPEAKING_RUBRIC = """
+You are an expert English speaking skills evaluator. Evaluate the student's speaking performance based on the transcription data.
+You will be given the topic details followed by the student's spoken response, speaking metrics
+and the fluency and content relevance scores already measured for it.
 
 Tasks:
-1. Score each criterion from 0 to 10
-2. Provide detailed feedback explaining the scores
+1. Score Pronunciation (0-10): Clarity, accuracy of sounds, word stress
+2. Provide detailed feedback explaining all the scores
 3. List 3 strengths and 3 areas for improvement
-4. Provide an example response for this topic
+
+Notes:
+- The response is a speech-to-text transcription: its spelling and punctuation are not the student's errors.
+- Do not re-score fluency or content relevance; explain them using the speaking metrics.
+- About 110-160 words per minute is a comfortable pace for students.
 
 Return JSON in this exact structure:
-{{
-  "fluency_score": 0-10,
+{
   "pronunciation_score": 0-10,
-  "content_relevance_score": 0-10,
-  "overall_score": 0-10,
-  "feedback": {{
+  "feedback": {
     "strengths": ["strength1", "strength2", "strength3"],
     "areas_for_improvement": ["improvement1", "improvement2", "improvement3"]
-  }},
-  "detailed_feedback": "Detailed explanation of the evaluation...",
-  "example_response": "Example response for this topic..."
-}}
+  },
+  "detailed_feedback": "Detailed explanation of the evaluation..."
+}
 """
+promptCache.check_static_prefix("speaking", SPEAKING_RUBRIC, SPEAKING_FEEDBACK_MODEL)
 
-        # Call OpenAI model
-        llm_response = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"},
-        )
+# Prompt used once per topic to produce the stored model response
+EXAMPLE_RESPONSE_PROMPT = """
+You are an English speaking coach.
+Write one example spoken response for the speaking topic below, as a fluent student would say it aloud.
+Return only the example response text.
+"""
+
+
+def render_topic_block(topic: dict) -> str:
+    """Render the per-topic part of the prompt"""
+    return f"""Topic Details:
+Title: {topic.get('title', 'N/A')}
+Description: {topic.get('description', 'N/A')}
+Level: {topic.get('level', 'N/A')}
+Difficulty: {topic.get('difficulty', 'N/A')}
+"""
 
-        # Parse response safely
-        try:
-            content = llm_response.choices[0].message.content
-            evaluation = SpeakingLLMEvaluation.parse_raw(content)
-        except Exception as e:
-            return JSONResponse(
-                status_code=500,
-                content={"message": "Invalid response format from evaluator."},
-            )
 
-        # Store evaluation in database
-        evaluation_doc = {
-            "user_id": user_id,
-            "topic_id": request.topic_id,
-            "evaluation_data": evaluation.dict(),
-            "transcription": [segment.dict() for segment in request.transcription],
-            "submitted_at": datetime.utcnow(),
+def build_speaking_messages(topic: dict, transcription, local_scores: dict) -> list:
+    """
+    Build the LLM evaluation messages for a speaking transcription.
+    Ordered static rubric -> memoized topic block -> student content so the
+    longest possible prefix is identical across requests.
+    """
+    # Combine transcription text
+    full_text = " ".join([segment.text for segment in transcription])
+
+    # Same figures as the local fluency score (jobs queued before these
+    # metrics were stored fall back to the scorer)
+    metrics = local_scores["metrics"]
+    if "total_time" not in metrics:
+        metrics = {
+            **metrics,
+            **evaluate_speaking_fluency([segment.dict() for segment in transcription]),
         }
 
-        await db.speaking_evaluations.insert_one(evaluation_doc)
+    block = promptCache.topic_block("speaking", topic, render_topic_block)
+    student_content = f"""
+Student's Spoken Response:
+"{full_text}"
 
-        return evaluation
+Speaking Metrics:
+- Words per minute: {metrics['words_per_minute']:.1f}
+- Total speaking time: {metrics['total_time']:.1f} seconds
+- Word count: {metrics['word_count']}
+- Average pause: {metrics['average_pause']:.2f} seconds
+
+Measured Scores:
+- Fluency: {local_scores['fluency_score']}/10
+- Content relevance: {local_scores['content_relevance_score']}/10
+"""
+    return [
+        {"role": "system", "content": SPEAKING_RUBRIC},
+        {"role": "user", "content": block + student_content},
+    ]
 
-    except Exception as e:
-        return JSONResponse(
-            status_code=500,
-            content={"message": f"An error occurred during evaluation: {str(e)}"},
-        )
+
+async def get_example_response(topic: dict) -> str:
+    """
+    Return the topic's stored example response, generating and storing it
+    on first use so it is not regenerated on every evaluation.
+    """
+    if topic.get("example_response"):
+        return topic["example_response"]
+
+    llm_response = await get_async_openai_client().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": EXAMPLE_RESPONSE_PROMPT},
+            {"role": "user", "content": render_topic_block(topic)},
+        ],
+    )
+    example_response = llm_response.choices[0].message.content.strip()
+
+    await db.speaking_topics.update_one(
+        {"topic_id": topic["topic_id"], "example_response": {"$exists": False}},
+        {"$set": {"example_response": example_response}},
+    )
+    topic["example_response"] = example_response
+    return example_response
 
 
 def empty_response(page: int, page_size: int) -> dict:
@@ -1,23 +1,54 @@
 # routers/vocabulary.py
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from database import db
 from bson import ObjectId
+from typing import Optional
+from datetime import datetime
+from pymongo import UpdateOne
+from models import VocabularyReviewBatch
 from utils.jwt import get_current_user
 from utils.allFunctions import AllFunctions
+from utils import vocabularyIndex, contentVersion, responses
+from utils.spacedRepetition import new_card, schedule
 
 router = APIRouter(prefix="/vocabulary", tags=["Vocabulary"])
 
+WORD_PROJECTION = {"_id": 0, "id": 1, "word": 1, "meaning": 1, "when_to_use": 1, "example": 1}
+
+
+async def ensure_indexes():
+    await db.vocabulary.create_index("id")
+    # One progress document per (user, word); "due today" is a range on due_at
+    await db.vocabulary_progress.create_index([("user_id", 1), ("word_id", 1)], unique=True)
+    await db.vocabulary_progress.create_index([("user_id", 1), ("due_at", 1)])
+
 # Get all vocabulary
 @router.get("/")
-async def get_vocabulary(page: int, page_size: int, user_id: str = Depends(get_current_user)):
-    vocab = []
-    return await AllFunctions().paginate(
+async def get_vocabulary(
+    request: Request, response: Response, page: int, page_size: int, user_id: str = Depends(get_current_user)
+):
+    not_modified = await contentVersion.conditional(request, response, "vocabulary")
+    if not_modified:
+        return not_modified
+    data = await AllFunctions().paginate(
         db.vocabulary,
         {},
         {"_id": 0, "word": 1, "meaning": 1, "when_to_use": 1, "example": 1},
         page,
         page_size
     )
+    return responses.render(data, response)
+
+# Prefix search / autocomplete, served from the in-memory index
+@router.get("/search")
+async def search_vocabulary(
+    q: str = Query(..., min_length=1, max_length=50),
+    standard: Optional[int] = None,
+    limit: int = Query(10, ge=1, le=50),
+    user_id: str = Depends(get_current_user)
+):
+    await vocabularyIndex.refresh(db)
+    return {"results": vocabularyIndex.search(q, standard, limit)}
 
 # # Get all vocabulary
 # @router.get("/")
@@ -36,13 +67,72 @@ async def get_vocabulary(page: int, page_size: int, user_id: str = Depends(get_c
 #     await db.vocabulary.insert_one(doc)
 #     return {"message": "Word added successfully"}
 
-# # Mark word as learned for user
-# @router.put("/learn/{word_id}")
-# async def mark_learned(word_id: str, user_id: str = Depends(get_current_user)):
-#     word = await db.vocabulary.find_one({"_id": ObjectId(word_id)})
-#     if not word:
-#         raise HTTPException(404, "Word not found")
-#     updated_users = [u for u in word.get("users_attempted", []) if str(u["user_id"]) != user_id]
-#     updated_users.append({"user_id": ObjectId(user_id), "status": "learned"})
-#     await db.vocabulary.update_one({"_id": ObjectId(word_id)}, {"$set": {"users_attempted": updated_users}})
-#     return {"message": "Marked as learned"}
+
+# Cards due for review, most overdue first
+@router.get("/due")
+async def get_due_cards(limit: int = Query(20, ge=1, le=100), user_id: str = Depends(get_current_user)):
+    now = datetime.utcnow()
+    progress = await db.vocabulary_progress.find(
+        {"user_id": user_id, "due_at": {"$lte": now}},
+        {"_id": 0, "word_id": 1, "due_at": 1, "interval_days": 1, "repetitions": 1}
+    ).sort("due_at", 1).limit(limit).to_list(limit)
+
+    words = {
+        w["id"]: w
+        async for w in db.vocabulary.find(
+            {"id": {"$in": [p["word_id"] for p in progress]}}, WORD_PROJECTION
+        )
+    }
+    due_count = await db.vocabulary_progress.count_documents(
+        {"user_id": user_id, "due_at": {"$lte": now}}
+    )
+    return {
+        "due": due_count,
+        "cards": [{**words[p["word_id"]], **p} for p in progress if p["word_id"] in words]
+    }
+
+
+# Submit a review session; each word is rescheduled with SM-2
+@router.post("/reviews")
+async def submit_reviews(batch: VocabularyReviewBatch, user_id: str = Depends(get_current_user)):
+    word_ids = list({r.word_id for r in batch.reviews})
+    known = set(await db.vocabulary.distinct("id", {"id": {"$in": word_ids}}))
+    unknown = set(word_ids) - known
+    if unknown:
+        raise HTTPException(404, f"Words not found: {', '.join(sorted(unknown))}")
+
+    cards = {
+        p["word_id"]: p
+        async for p in db.vocabulary_progress.find(
+            {"user_id": user_id, "word_id": {"$in": word_ids}}, {"_id": 0}
+        )
+    }
+    now = datetime.utcnow()
+    for review in batch.reviews:
+        card = cards.get(review.word_id) or new_card()
+        cards[review.word_id] = {**card, **schedule(card, review.quality, now)}
+    for card in cards.values():
+        for key in ("user_id", "word_id", "created_at"):
+            card.pop(key, None)
+
+    await db.vocabulary_progress.bulk_write(
+        [
+            UpdateOne(
+                {"user_id": user_id, "word_id": word_id},
+                {
+                    "$set": cards[word_id],
+                    "$setOnInsert": {"created_at": now},
+                },
+                upsert=True,
+            )
+            for word_id in word_ids
+        ],
+        ordered=False,
+    )
+    return {
+        "reviewed": len(batch.reviews),
+        "schedule": [
+            {"word_id": word_id, "due_at": cards[word_id]["due_at"], "interval_days": cards[word_id]["interval_days"]}
+            for word_id in word_ids
+        ]
+    }
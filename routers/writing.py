@@ -1,19 +1,21 @@
 # routers/writing.py
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Header, BackgroundTasks, Request, Response
 from database import db
 from models import WritingAnswer, WritingTopicIn
 from bson import ObjectId
 from datetime import datetime
 from utils.jwt import get_current_user
 import uuid
+import asyncio
 from utils.allFunctions import AllFunctions
+from utils import idempotency, evaluationQueue, promptCache, vectorIndex, submissions, contentVersion, responses
+from utils.evaluationQueue import EvaluationError
+from utils.jsonStream import JSONFieldStream, sse_event
 from typing import List
 from pydantic import BaseModel
 from typing import List, Optional
-from fastapi.responses import JSONResponse
-from openai import AsyncOpenAI
-
-client = AsyncOpenAI()
+from fastapi.responses import JSONResponse, StreamingResponse
+from config import get_async_openai_client
 
 
 class Feedback(BaseModel):
@@ -24,7 +26,6 @@ class Feedback(BaseModel):
 class Evaluation(BaseModel):
     overall_score: int
     feedback: Feedback
-    example_answer: str
 
 
 router = APIRouter(prefix="/writing", tags=["Writing"])
@@ -33,6 +34,8 @@ router = APIRouter(prefix="/writing", tags=["Writing"])
 # Get writing topics
 @router.get("/topics")
 async def get_topics(
+    request: Request,
+    response: Response,
     page: int,
     page_size: int,
     level_beginner: Optional[str] = Query(None, alias="level.beginner"),
@@ -42,6 +45,13 @@ async def get_topics(
     category: Optional[str] = Query(None),
     user_id: Optional[str] = Depends(get_current_user),
 ):
+    # Filtering by solved status makes the page depend on the user's submissions
+    versions = ["writing_topics"]
+    if status:
+        versions.append(contentVersion.user_key("writing_evaluations", user_id))
+    not_modified = await contentVersion.conditional(request, response, *versions)
+    if not_modified:
+        return not_modified
     try:
         # Build base query with AND relationship
         query = {}
@@ -154,12 +164,13 @@ async def get_topics(
                 "_id": 0,
                 "standard": 0,
                 "created_at": 0,
+                "example_answer": 0,
             },
             page,
             page_size,
         )
 
-        return data
+        return responses.render(data, response)
 
     except Exception as e:
         return JSONResponse(
@@ -169,43 +180,30 @@ async def get_topics(
 
 
 @router.get("/topics/submissions")
-async def get_submissions(user_id: str = Depends(get_current_user)):
+async def get_submissions(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    user_id: str = Depends(get_current_user),
+):
+    """The user's submissions, newest first, as summaries (title, score, date)"""
     try:
-        # Fetch all submissions by user
-        submissions = await db.writing_evaluations.find(
-            {"user_id": user_id}, {"_id": 0, "user_id": 0, "transcription": 0}
-        ).to_list(None)
-
-        if not submissions:
-            return []
-
-        # Extract all topic_ids from submissions
-        topics_ids = [s["topic_id"] for s in submissions]
+        page = await submissions.list_submissions("writing_evaluations", user_id, cursor, limit)
+        return responses.render(page)
+    except submissions.InvalidCursor as e:
+        raise HTTPException(400, str(e))
 
-        # Fetch passage details for these passage_ids
-        topics = await db.writing_topics.find(
-            {"topic_id": {"$in": topics_ids}},
-            {"_id": 0, "topic_id": 1, "title": 1},
-        ).to_list(None)
 
-        # Create a quick lookup map: {topic_id: title}
-        topic_map = {t["topic_id"]: t["title"] for t in topics}
-
-        # Append title to each submission
-        for sub in submissions:
-            sub["title"] = topic_map.get(sub["topic_id"], "Unknown Title")
-
-        return submissions
-
-    except Exception as e:
-        return JSONResponse(
-            status_code=500,
-            content={"message": f"Server Error: {str(e)}"},
-        )
+@router.get("/topics/submissions/{submission_id}")
+async def get_submission(submission_id: str, user_id: str = Depends(get_current_user)):
+    """One submission with its full evaluation_data"""
+    submission = await submissions.get_submission("writing_evaluations", user_id, submission_id)
+    if not submission:
+        raise HTTPException(404, "Submission not found")
+    return responses.render(submission)
 
 
 @router.post("/topics")
-async def add_topic(topic: WritingTopicIn):
+async def add_topic(topic: WritingTopicIn, background_tasks: BackgroundTasks):
     topic_doc = {
         "topic_id": str(uuid.uuid4()),  # generate UUID
         "category": topic.category,
@@ -218,17 +216,52 @@ async def add_topic(topic: WritingTopicIn):
     }
 
     result = await db.writing_topics.insert_one(topic_doc)
-    return {**topic_doc, "_id": str(result.inserted_id)}
+    await contentVersion.bump("writing_topics")
+    response = {**topic_doc, "_id": str(result.inserted_id)}
+
+    # 📝 Index the topic and generate the model answer once, off the request path
+    # Index first: a failed LLM call stops the tasks queued after it
+    background_tasks.add_task(vectorIndex.index_in_background, "writing_topics", topic_doc)
+    background_tasks.add_task(get_example_answer, topic_doc)
+    return response
+
+
+@router.get("/topics/similar/{topic_id}")
+async def get_similar_topics(
+    topic_id: str,
+    k: int = Query(5, ge=1, le=50),
+    level: Optional[str] = Query(None),
+    difficulty: Optional[str] = Query(None),
+    user_id: str = Depends(get_current_user),
+):
+    """Topics most similar to the given one, optionally filtered by level/difficulty"""
+    results = await vectorIndex.similar_documents(
+        db, "writing_topics", topic_id, k, level, difficulty
+    )
+    if results is None:
+        return JSONResponse(
+            status_code=404,
+            content={"message": "Topic not found"},
+        )
+    return results
 
 
 # Get writing topics
 @router.get("/topics/{topic_id}")
-async def get_topic(topic_id: str, user_id: str = Depends(get_current_user)):
+async def get_topic(
+    request: Request, response: Response, topic_id: str, user_id: str = Depends(get_current_user)
+):
+    # The topic carries this user's evaluation, so their submissions count too
+    not_modified = await contentVersion.conditional(
+        request, response, "writing_topics", contentVersion.user_key("writing_evaluations", user_id)
+    )
+    if not_modified:
+        return not_modified
     try:
         # Fetch topic (only one expected per topic_id)
         topic = await db.writing_topics.find_one(
             {"topic_id": topic_id},
-            {"_id": 0, "standard": 0, "audience": 0, "created_at": 0},
+            {"_id": 0, "standard": 0, "audience": 0, "created_at": 0, "example_answer": 0},
         )
         if not topic:
             return JSONResponse(
@@ -245,7 +278,7 @@ async def get_topic(topic_id: str, user_id: str = Depends(get_current_user)):
         topic["solved"] = bool(solved)
         topic["evaluation_data"] = solved.get("evaluation_data") if solved else None
 
-        return topic
+        return responses.render(topic, response)
 
     except Exception as e:
 
@@ -257,97 +290,282 @@ async def get_topic(topic_id: str, user_id: str = Depends(get_current_user)):
 
 @router.post("/verify")
 async def submit_writing(
+    answer: WritingAnswer,
+    user_id: str = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    # ♻️ Return an in-flight or completed evaluation instead of running it again
+    key = idempotency.request_key(
+        "writing", user_id, answer.topic_id, answer.your_answer, idempotency_key
+    )
+    try:
+        stored = await idempotency.claim(
+            key, idempotency.payload_hash(user_id, answer.topic_id, answer.your_answer)
+        )
+    except idempotency.EvaluationInProgress:
+        return JSONResponse(
+            status_code=409,
+            content={"message": "Evaluation already in progress, retry shortly."},
+        )
+    except idempotency.IdempotencyKeyReused:
+        return JSONResponse(
+            status_code=422,
+            content={"message": "Idempotency-Key was already used for a different submission."},
+        )
+    if stored is not None:
+        return stored
+
+    try:
+        response = await run_writing_evaluation(answer, user_id)
+    except EvaluationError as e:
+        await idempotency.release(key)
+        return JSONResponse(status_code=e.status_code, content={"message": e.message})
+    except Exception as e:
+        # 🛑 Catch-all for unexpected issues
+        await idempotency.release(key)
+        return JSONResponse(
+            status_code=500,
+            content={"message": f"Server error: {str(e)}"},
+        )
+
+    await idempotency.complete(key, response)
+    return response
+
+
+@router.post("/verify/async", status_code=202)
+async def submit_writing_async(
     answer: WritingAnswer, user_id: str = Depends(get_current_user)
 ):
+    """
+    Queue a writing evaluation and return immediately with a job id.
+    Poll GET /jobs/{job_id} or listen on /jobs/{job_id}/ws for the result.
+    """
+    job_id = await evaluationQueue.submit("writing", user_id, answer.dict())
+    return {"job_id": job_id, "status": "queued"}
+
+
+async def run_writing_evaluation(answer: WritingAnswer, user_id: str):
+    """
+    Evaluate a writing answer with the LLM and save the result.
+    Raises EvaluationError when the topic or the evaluator output is invalid.
+    """
+    # 🔍 1. Fetch the topic
+    topic = await db.writing_topics.find_one({"topic_id": answer.topic_id})
+    if not topic:
+        raise EvaluationError(404, "Topic not found")
+
+    # 🧠 2. Build the LLM evaluation prompt
+    messages = build_writing_messages(topic, answer.your_answer)
+
+    # ⚙️ 3. Call OpenAI model (the topic's example answer is generated only once)
+    llm_response, example_answer = await asyncio.gather(
+        get_async_openai_client().chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            response_format={"type": "json_object"},
+        ),
+        get_example_answer(topic),
+    )
+    promptCache.record_usage("writing", llm_response.usage)
+
+    # 🧾 4. Parse response safely
     try:
-        # 🔍 1. Fetch the topic
-        topic = await db.writing_topics.find_one({"topic_id": answer.topic_id})
-        if not topic:
-            return JSONResponse(
-                status_code=404,
-                content={"message": "Topic not found"},
+        content = llm_response.choices[0].message.content
+        evaluation = Evaluation.parse_raw(content)
+    except Exception:
+        raise EvaluationError(500, "Invalid response format from evaluator.")
+
+    # 🗃️ 5. Prepare evaluation data
+    evaluation_data = build_evaluation_data(
+        answer.your_answer, evaluation, example_answer
+    )
+
+    # 💾 6. Save evaluation in DB
+    await save_writing_evaluation(user_id, topic, evaluation_data)
+
+    # ✅ 7. Return structured response
+    return evaluation_data
+
+
+async def process_writing_job(user_id: str, payload: dict):
+    """Evaluation queue handler for writing submissions"""
+    return await run_writing_evaluation(WritingAnswer(**payload), user_id)
+
+
+evaluationQueue.register_handler("writing", process_writing_job)
+
+
+@router.post("/verify/stream")
+async def submit_writing_stream(
+    answer: WritingAnswer, user_id: str = Depends(get_current_user)
+):
+    """
+    Stream the evaluation as Server-Sent Events.
+    Emits overall_score, strengths and areas_for_improvement as soon as each
+    is generated, then the topic's example_answer, then `done` with the
+    saved evaluation.
+    """
+    topic = await db.writing_topics.find_one({"topic_id": answer.topic_id})
+    if not topic:
+        return JSONResponse(
+            status_code=404,
+            content={"message": "Topic not found"},
+        )
+
+    messages = build_writing_messages(topic, answer.your_answer)
+
+    async def event_stream():
+        fields = JSONFieldStream(["overall_score", "strengths", "areas_for_improvement"])
+        example_task = asyncio.ensure_future(get_example_answer(topic))
+        try:
+            stream = await get_async_openai_client().chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                response_format={"type": "json_object"},
+                stream=True,
+                stream_options={"include_usage": True},
             )
+            async for chunk in stream:
+                if chunk.usage:
+                    promptCache.record_usage("writing", chunk.usage)
+                if not chunk.choices:
+                    continue
+                for name, value in fields.feed(chunk.choices[0].delta.content or ""):
+                    yield sse_event(name, value)
+            example_answer = await example_task
+            yield sse_event("example_answer", example_answer)
+        except Exception as e:
+            example_task.cancel()
+            yield sse_event("error", {"message": f"Server error: {str(e)}"})
+            return
 
-        # 🧠 2. Build the LLM evaluation prompt
-        prompt = f"""
-You are an English writing evaluator.
-The topic details are:
-Category: {topic.get('category', 'N/A')}
-Title: {topic.get('title', 'N/A')}
-Description: {topic.get('description', 'N/A')}
-Standard: {topic.get('standard', 'N/A')}
-Difficulty: {topic.get('difficulty', 'N/A')}
-Audience: {topic.get('audience', 'N/A')}
-Guidelines: {topic.get('guidelines', 'None')}
+        # Validate the full response before persisting it
+        try:
+            evaluation = Evaluation.parse_raw(fields.buffer)
+        except Exception:
+            yield sse_event(
+                "error", {"message": "Invalid response format from evaluator."}
+            )
+            return
+
+        evaluation_data = build_evaluation_data(
+            answer.your_answer, evaluation, example_answer
+        )
+        await save_writing_evaluation(user_id, topic, evaluation_data)
+        yield sse_event("done", evaluation_data)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-Student's answer:
-{answer.your_answer}
+
+# Static rubric sent first so every request shares the same cacheable prefix
+WRITING_RUBRIC = """
+You are an English writing evaluator.
+You will be given the topic details followed by the student's answer.
 
 Tasks:
 1. Score the answer from 0 to 10 based on relevance, clarity, grammar, structure, and adherence to guidelines.
 2. Give feedback with two lists:
    - strengths: list of 3 positive points
    - areas_for_improvement: list of 3 improvement points
-3. Provide a well-written example answer.
 
 
 Strictly Return JSON in this structure:
-{{
+{
   "overall_score": 0-10,
-  "feedback": {{
+  "feedback": {
     "strengths": ["...","...","..."],
     "areas_for_improvement": ["...","...","..."]
-  }},
-  "example_answer": "..."
-}}
+  }
+}
 """
+promptCache.check_static_prefix("writing", WRITING_RUBRIC, "gpt-4o-mini")
 
-        # ⚙️ 3. Call OpenAI model
-        llm_response = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"},
-        )
+# Prompt used once per topic to produce the stored model answer
+EXAMPLE_ANSWER_PROMPT = """
+You are an English writing teacher.
+Write one well-written example answer for the writing topic below that follows all of its guidelines.
+Return only the example answer text.
+"""
 
-        # 🧾 4. Parse response safely
-        try:
-            content = llm_response.choices[0].message.content
-            evaluation = Evaluation.parse_raw(content)
-        except Exception as e:
-            return JSONResponse(
-                status_code=500,
-                content={
-                    "message": "Invalid response format from evaluator.",
-                },
-            )
 
-        # 🗃️ 5. Prepare evaluation data
-        evaluation_data = {
-            "your_answer": answer.your_answer,
-            "overall_score": evaluation.overall_score,
-            "feedback": evaluation.feedback.dict(),
-            "example_answer": evaluation.example_answer,
-        }
+def render_topic_block(topic: dict) -> str:
+    """Render the per-topic part of the prompt"""
+    return f"""The topic details are:
+Category: {topic.get('category', 'N/A')}
+Title: {topic.get('title', 'N/A')}
+Description: {topic.get('description', 'N/A')}
+Standard: {topic.get('standard', 'N/A')}
+Difficulty: {topic.get('difficulty', 'N/A')}
+Audience: {topic.get('audience', 'N/A')}
+Guidelines: {topic.get('guidelines', 'None')}
+"""
 
-        # 💾 6. Save evaluation in DB
-        record = {
-            "user_id": user_id,
-            "topic_id": answer.topic_id,
-            "evaluation_data": evaluation_data,
-            "submitted_at": datetime.utcnow(),
-        }
 
-        await db.writing_evaluations.insert_one(record)
+def build_writing_messages(topic: dict, your_answer: str) -> list:
+    """
+    Build the LLM evaluation messages for a writing answer.
+    Ordered static rubric -> memoized topic block -> student answer so the
+    longest possible prefix is identical across requests.
+    """
+    block = promptCache.topic_block("writing", topic, render_topic_block)
+    return [
+        {"role": "system", "content": WRITING_RUBRIC},
+        {"role": "user", "content": f"{block}\nStudent's answer:\n{your_answer}"},
+    ]
+
+
+async def get_example_answer(topic: dict) -> str:
+    """
+    Return the topic's stored example answer, generating and storing it
+    on first use so it is not regenerated on every evaluation.
+    """
+    if topic.get("example_answer"):
+        return topic["example_answer"]
+
+    llm_response = await get_async_openai_client().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": EXAMPLE_ANSWER_PROMPT},
+            {"role": "user", "content": render_topic_block(topic)},
+        ],
+    )
+    example_answer = llm_response.choices[0].message.content.strip()
+
+    await db.writing_topics.update_one(
+        {"topic_id": topic["topic_id"], "example_answer": {"$exists": False}},
+        {"$set": {"example_answer": example_answer}},
+    )
+    topic["example_answer"] = example_answer
+    return example_answer
+
+
+def build_evaluation_data(
+    your_answer: str, evaluation: Evaluation, example_answer: str
+) -> dict:
+    """Shape a parsed evaluation into the stored/returned structure"""
+    return {
+        "your_answer": your_answer,
+        "overall_score": evaluation.overall_score,
+        "feedback": evaluation.feedback.dict(),
+        "example_answer": example_answer,
+    }
 
-        # ✅ 7. Return structured response
-        return evaluation_data
 
-    except Exception as e:
-        # 🛑 Catch-all for unexpected issues
-        return JSONResponse(
-            status_code=500,
-            content={"message": f"Server error: {str(e)}"},
-        )
+async def save_writing_evaluation(user_id: str, topic: dict, evaluation_data: dict):
+    """Persist a finished writing evaluation (the topic title is stored for history lists)"""
+    record = {
+        "user_id": user_id,
+        "topic_id": topic["topic_id"],
+        "title": topic.get("title"),
+        "evaluation_data": evaluation_data,
+        "submitted_at": datetime.utcnow(),
+    }
+    await db.writing_evaluations.insert_one(record)
+    await contentVersion.bump(contentVersion.user_key("writing_evaluations", user_id))
 
 
 def empty_response(page: int, page_size: int) -> dict:
@@ -5,11 +5,14 @@ Generates engaging stories for teachers to introduce new chapters.
 """
 
 import os
-import openai
+import argparse
+import json
+import uuid
 # from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 import logging
-from config import llm, OPENAI_MODEL, OPENAI_API_KEY
+from config import get_openai_client, OPENAI_MODEL
 # Load environment variables
 # load_dotenv()
 logger = logging.getLogger(__name__)
@@ -24,10 +27,6 @@ logging.basicConfig(
 # if not API_KEY:
 #     raise ValueError("OPENAI_API_KEY not found in environment variables.")
 
-# Initialize OpenAI client with modern API
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
-
-
 # Story length mapping
 LENGTHS = {
     "short": "2-3 paragraphs (150-200 words)",
@@ -65,7 +64,7 @@ def generate_story(standard, subject, chapter, emotion, story_length="medium", l
 
 
     try:
-        response = client.chat.completions.create(
+        response = get_openai_client().chat.completions.create(
             model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": system_msg},
@@ -77,3 +76,255 @@ def generate_story(standard, subject, chapter, emotion, story_length="medium", l
         return response.choices[0].message.content.strip()
     except Exception as e:
         return f"Error: {e}"
+
+
+# -------------------------
+# Batch CLI
+# -------------------------
+# Entries use the grammarQA_generation.txt shape; the optional keys below
+# fall back to these defaults. `level` values become passage difficulties.
+DEFAULT_EMOTIONS = ["curious"]
+DEFAULT_PASSAGE_LEVELS = ["intermediate"]
+DEFAULT_DIFFICULTIES = ["medium"]
+ID_FIELDS = {"story": "story_id", "passage": "passage_id"}
+
+
+def plan_jobs(curriculum: list, kind: str) -> list:
+    """Expand curriculum entries into (key, kind, params) jobs with stable keys"""
+    jobs = []
+    for entry in curriculum:
+        standard = entry["standard"]
+        for topic in entry["topics"]:
+            if kind in ("stories", "both"):
+                for emotion in entry.get("emotions", DEFAULT_EMOTIONS):
+                    params = {
+                        "standard": standard,
+                        "subject": entry.get("subject", "English"),
+                        "chapter": topic,
+                        "emotion": emotion,
+                        "story_length": entry.get("story_length", "medium"),
+                        "language": entry.get("language", "English"),
+                    }
+                    jobs.append((f"story|{standard}|{topic}|{emotion}", "story", params))
+            if kind in ("passages", "both"):
+                for level in entry.get("passage_level", DEFAULT_PASSAGE_LEVELS):
+                    for difficulty in entry.get("level", DEFAULT_DIFFICULTIES):
+                        params = {
+                            "standard": standard,
+                            "title": topic,
+                            "level": level,
+                            "difficulty": difficulty,
+                            "length": entry.get("length", "medium"),
+                        }
+                        key = f"passage|{standard}|{topic}|{level}|{difficulty}"
+                        jobs.append((key, "passage", params))
+    return jobs
+
+
+def run_job(kind: str, params: dict) -> dict:
+    """Generate one story or passage record (runs in a worker thread)"""
+    if kind == "story":
+        story = generate_story(
+            f"Standard {params['standard']}",
+            params["subject"],
+            params["chapter"],
+            params["emotion"],
+            params["story_length"],
+            params["language"],
+        )
+        if story.startswith("Error:"):
+            raise RuntimeError(story[len("Error:"):].strip())
+        return {
+            "story_id": str(uuid.uuid4()),
+            **params,
+            "story": story,
+            "created_at": datetime.utcnow(),
+        }
+
+    from unseen_passage_generator import generate_passage, build_passage_record
+
+    return build_passage_record(generate_passage(dict(params)))
+
+
+def batch_item_id(checkpoint: str, key: str) -> str:
+    """Same id for a job every time it runs under one checkpoint, so a resumed write is a no-op"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{os.path.abspath(checkpoint)}|{key}"))
+
+
+def load_checkpoint(path: str) -> dict:
+    """Last recorded status per job key; a missing file means a fresh run"""
+    statuses = {}
+    if not os.path.exists(path):
+        return statuses
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from a crash
+            statuses[entry["key"]] = entry["status"]
+    return statuses
+
+
+class Sink:
+    """
+    Writes generated records in bulk to Mongo or NDJSON. Records whose id
+    was already written (by a run that crashed before checkpointing) are
+    skipped, so resuming never stores an item twice.
+    """
+
+    def __init__(self, output: str, out_file: str = None):
+        self.output = output
+        self.out_file = out_file
+        self.client = None
+        self.written_ids = set()
+        if output == "mongo":
+            from mongodb_client import MongoDBClient
+
+            self.client = MongoDBClient()
+        elif os.path.exists(out_file):
+            with open(out_file, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.written_ids.add(record.get(ID_FIELDS.get(record.get("kind"), "")))
+
+    def write(self, kind: str, records: list) -> list:
+        """Persist records of one kind; returns [(record, existing_id)] skipped as duplicates"""
+        if not records:
+            return []
+        id_field = ID_FIELDS[kind]
+        if self.output == "ndjson":
+            with open(self.out_file, "a", encoding="utf-8") as f:
+                for record in records:
+                    if record[id_field] in self.written_ids:
+                        continue
+                    f.write(json.dumps({"kind": kind, **record}, default=str) + "\n")
+                    self.written_ids.add(record[id_field])
+            return []
+
+        if kind == "passage":
+            from unseen_passage_generator import store_passages
+
+            collection = self.client.get_collection("reading_passages")
+            stored = {
+                doc[id_field]
+                for doc in collection.find(
+                    {id_field: {"$in": [record[id_field] for record in records]}},
+                    {"_id": 0, id_field: 1},
+                )
+            }
+            _, duplicates = store_passages(
+                self.client, [record for record in records if record[id_field] not in stored]
+            )
+            return duplicates
+
+        from pymongo import UpdateOne
+
+        self.client.get_collection("stories").bulk_write(
+            [
+                UpdateOne({id_field: record[id_field]}, {"$setOnInsert": record}, upsert=True)
+                for record in records
+            ],
+            ordered=False,
+        )
+        return []
+
+
+def run_batch(jobs: list, sink: Sink, checkpoint: str, concurrency: int, batch_size: int):
+    """
+    Generate pending jobs on a thread pool. The main thread owns all writes:
+    records are flushed every `batch_size` and only then marked done in the
+    checkpoint; items keep a deterministic id, so a batch written just
+    before a crash is not stored again when it is regenerated.
+    """
+    statuses = load_checkpoint(checkpoint)
+    pending = [job for job in jobs if statuses.get(job[0]) not in ("done", "duplicate")]
+    logger.info(f"{len(jobs) - len(pending)} of {len(jobs)} jobs already done, {len(pending)} to run")
+    if not pending:
+        return {"done": 0, "duplicate": 0, "failed": 0}
+
+    counts = {"done": 0, "duplicate": 0, "failed": 0}
+    buffer = {"story": [], "passage": []}
+
+    with open(checkpoint, "a", encoding="utf-8") as log:
+
+        def record(key, status, error=None):
+            counts[status] += 1
+            log.write(json.dumps({"key": key, "status": status, "error": error}) + "\n")
+
+        def flush():
+            for kind, items in buffer.items():
+                if not items:
+                    continue
+                duplicates = sink.write(kind, [item for _, item in items])
+                duplicate_ids = {id(item) for item, _ in duplicates}
+                for key, item in items:
+                    record(key, "duplicate" if id(item) in duplicate_ids else "done")
+                items.clear()
+            log.flush()
+            os.fsync(log.fileno())
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {executor.submit(run_job, kind, params): key for key, kind, params in pending}
+            try:
+                for future in as_completed(futures):
+                    key = futures[future]
+                    try:
+                        item = future.result()
+                    except Exception as e:
+                        logger.error(f"{key} failed: {e}")
+                        record(key, "failed", str(e))
+                        continue
+                    kind = key.split("|", 1)[0]
+                    item[ID_FIELDS[kind]] = batch_item_id(checkpoint, key)
+                    buffer[kind].append((key, item))
+                    if sum(len(items) for items in buffer.values()) >= batch_size:
+                        flush()
+            except KeyboardInterrupt:
+                logger.info("Interrupted; saving finished work")
+                for future in futures:
+                    future.cancel()
+                raise
+            finally:
+                flush()
+
+    return counts
+
+
+def main():
+    """Batch-generate stories and passages from a curriculum file (resumable)"""
+    parser = argparse.ArgumentParser(
+        description="Pre-build story and passage libraries from a curriculum file."
+    )
+    parser.add_argument("curriculum", help="JSON list in the grammarQA_generation.txt shape")
+    parser.add_argument("--kind", choices=["stories", "passages", "both"], default="both")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("GENERATION_CONCURRENCY", 4)))
+    parser.add_argument("--batch-size", type=int, default=20, help="records per bulk write")
+    parser.add_argument("--output", choices=["mongo", "ndjson"], default="mongo")
+    parser.add_argument("--out-file", default="generated_content.ndjson", help="NDJSON output path")
+    parser.add_argument("--checkpoint", default=None,
+                        help="progress log; rerun with the same file to resume (default: <curriculum>.checkpoint.jsonl)")
+    args = parser.parse_args()
+
+    with open(args.curriculum, encoding="utf-8") as f:
+        curriculum = json.load(f)
+    checkpoint = args.checkpoint or f"{args.curriculum}.checkpoint.jsonl"
+
+    counts = run_batch(
+        plan_jobs(curriculum, args.kind),
+        Sink(args.output, args.out_file),
+        checkpoint,
+        max(1, args.concurrency),
+        max(1, args.batch_size),
+    )
+    logger.info(
+        f"Finished: {counts['done']} written, {counts['duplicate']} near-duplicates skipped, "
+        f"{counts['failed']} failed (rerun to retry failures)"
+    )
+
+
+if __name__ == "__main__":
+    main()
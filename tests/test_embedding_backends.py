@@ -0,0 +1,39 @@
+# tests/test_embedding_backends.py
+"""
+Needs the `onnx` extra and network access for the first model download:
+
+    uv run --extra onnx pytest tests/test_embedding_backends.py
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("optimum")
+
+from utils import allFunctions  # noqa: E402
+
+# Small model so the export stays fast; the file naming does not depend on it
+MODEL = os.getenv("TEST_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+
+def test_onnx_int8_default_config_loads_and_reuses_export(tmp_path, monkeypatch):
+    import sentence_transformers
+
+    monkeypatch.setattr(allFunctions, "EMBEDDING_ONNX_DIR", str(tmp_path))
+    monkeypatch.setattr(allFunctions, "EMBEDDING_ONNX_QUANTIZATION", "avx2")  # the default
+
+    model = allFunctions.load_embedding_model(MODEL, "onnx-int8")
+    vectors = model.encode(["hello world"], normalize_embeddings=True)
+    assert vectors.shape[0] == 1
+
+    # A second start must load the exported file, not export again
+    def fail(*args, **kwargs):
+        raise AssertionError("quantized model was exported twice")
+
+    monkeypatch.setattr(sentence_transformers, "export_dynamic_quantized_onnx_model", fail)
+    allFunctions.load_embedding_model(MODEL, "onnx-int8")
@@ -0,0 +1,136 @@
+# tests/test_evaluation_queue.py
+"""
+Runs the job queue against an in-memory MongoDB:
+
+    uv run --with mongomock-motor pytest tests/test_evaluation_queue.py
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("motor")
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from utils import evaluationQueue  # noqa: E402
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    db = mongomock_motor.AsyncMongoMockClient()["test"]
+    monkeypatch.setattr(evaluationQueue, "db", db)
+    monkeypatch.setattr(evaluationQueue, "_queue", None)
+    monkeypatch.setattr(evaluationQueue, "_handlers", {})
+    return db.evaluation_jobs
+
+
+async def insert_job(jobs, job_id, status="queued", age_seconds=0):
+    updated_at = datetime.utcnow() - timedelta(seconds=age_seconds)
+    await jobs.insert_one(
+        {
+            "job_id": job_id,
+            "kind": "test",
+            "user_id": "u1",
+            "payload": {},
+            "status": status,
+            "result": None,
+            "error": None,
+            "created_at": updated_at,
+            "updated_at": updated_at,
+        }
+    )
+
+
+def test_job_is_claimed_and_run_once(jobs):
+    calls = []
+
+    async def handler(user_id, payload):
+        calls.append(user_id)
+        return {"score": 7}
+
+    async def scenario():
+        evaluationQueue.register_handler("test", handler)
+        await insert_job(jobs, "j1")
+        await asyncio.gather(evaluationQueue._process("j1"), evaluationQueue._process("j1"))
+        return await jobs.find_one({"job_id": "j1"})
+
+    job = asyncio.run(scenario())
+    assert calls == ["u1"]
+    assert job["status"] == "completed"
+    assert job["result"] == {"score": 7}
+    assert job["expires_at"] > job["updated_at"]
+
+
+def test_requeue_stale_only_takes_expired_leases(jobs):
+    async def scenario():
+        await insert_job(jobs, "dead", "running", evaluationQueue.RUNNING_LEASE_SECONDS + 5)
+        await insert_job(jobs, "orphaned", "queued", evaluationQueue.RUNNING_LEASE_SECONDS + 5)
+        await insert_job(jobs, "busy", "running")
+        taken = await evaluationQueue.requeue_stale()
+        statuses = {job["job_id"]: job["status"] async for job in jobs.find()}
+        return taken, statuses
+
+    taken, statuses = asyncio.run(scenario())
+    assert taken == 2
+    assert statuses == {"dead": "queued", "orphaned": "queued", "busy": "running"}
+
+
+def test_running_job_renews_its_lease(jobs, monkeypatch):
+    monkeypatch.setattr(evaluationQueue, "RUNNING_LEASE_SECONDS", 0.3)
+    monkeypatch.setattr(evaluationQueue, "LEASE_RENEW_SECONDS", 0.05)
+
+    async def handler(user_id, payload):
+        await asyncio.sleep(0.6)
+        return {"score": 5}
+
+    async def scenario():
+        evaluationQueue.register_handler("test", handler)
+        await insert_job(jobs, "slow")
+        worker = asyncio.create_task(evaluationQueue._process("slow"))
+        await asyncio.sleep(0.45)
+        taken = await evaluationQueue.requeue_stale()
+        await worker
+        return taken, await jobs.find_one({"job_id": "slow"})
+
+    taken, job = asyncio.run(scenario())
+    assert taken == 0
+    assert job["status"] == "completed"
+
+
+def test_taken_over_job_discards_stale_result(jobs, monkeypatch):
+    # Renewal never fires here, as if the first worker had stalled
+    monkeypatch.setattr(evaluationQueue, "LEASE_RENEW_SECONDS", 3600)
+
+    async def scenario():
+        stalled = asyncio.Event()
+
+        async def first(user_id, payload):
+            await stalled.wait()
+            return {"owner": "first"}
+
+        async def second(user_id, payload):
+            return {"owner": "second"}
+
+        evaluationQueue.register_handler("test", first)
+        await insert_job(jobs, "j1")
+        worker = asyncio.create_task(evaluationQueue._process("j1"))
+        await asyncio.sleep(0.01)
+
+        # Lease expires and another worker takes the job over
+        expired = datetime.utcnow() - timedelta(seconds=evaluationQueue.RUNNING_LEASE_SECONDS + 5)
+        await jobs.update_one({"job_id": "j1"}, {"$set": {"updated_at": expired}})
+        assert await evaluationQueue.requeue_stale() == 1
+        evaluationQueue.register_handler("test", second)
+        await evaluationQueue._process("j1")
+
+        stalled.set()
+        await worker
+        return await jobs.find_one({"job_id": "j1"})
+
+    job = asyncio.run(scenario())
+    assert job["status"] == "completed"
+    assert job["result"] == {"owner": "second"}
@@ -0,0 +1,74 @@
+# tests/test_idempotency.py
+"""
+Runs the evaluation claims against an in-memory MongoDB:
+
+    uv run --with mongomock-motor pytest tests/test_idempotency.py
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("motor")
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from utils import idempotency  # noqa: E402
+
+
+@pytest.fixture
+def requests(monkeypatch):
+    db = mongomock_motor.AsyncMongoMockClient()["test"]
+    monkeypatch.setattr(idempotency, "db", db)
+    monkeypatch.setattr(idempotency, "IN_FLIGHT_WAIT_SECONDS", 0)
+    asyncio.run(idempotency.ensure_indexes())
+    return db.evaluation_requests
+
+
+def test_first_claim_runs_and_retry_gets_stored_result(requests):
+    async def scenario():
+        first = await idempotency.claim("k", "fp")
+        await idempotency.complete("k", {"score": 8})
+        return first, await idempotency.claim("k", "fp")
+
+    assert asyncio.run(scenario()) == (None, {"score": 8})
+
+
+def test_pending_claim_blocks_a_second_caller(requests):
+    async def scenario():
+        assert await idempotency.claim("k", "fp") is None
+        await idempotency.claim("k", "fp")
+
+    with pytest.raises(idempotency.EvaluationInProgress):
+        asyncio.run(scenario())
+
+
+def test_key_reused_with_another_payload_is_rejected(requests):
+    async def scenario():
+        await idempotency.claim("k", "fp")
+        await idempotency.claim("k", "other")
+
+    with pytest.raises(idempotency.IdempotencyKeyReused):
+        asyncio.run(scenario())
+
+
+def test_stale_pending_claim_is_taken_over(requests):
+    async def scenario():
+        await idempotency.claim("k", "fp")
+        abandoned = datetime.utcnow() - timedelta(seconds=idempotency.PENDING_LEASE_SECONDS + 5)
+        await requests.update_one({"key": "k"}, {"$set": {"created_at": abandoned}})
+        return await idempotency.claim("k", "fp")
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_released_claim_can_be_claimed_again(requests):
+    async def scenario():
+        await idempotency.claim("k", "fp")
+        await idempotency.release("k")
+        return await idempotency.claim("k", "fp")
+
+    assert asyncio.run(scenario()) is None
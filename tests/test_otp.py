@@ -0,0 +1,131 @@
+# tests/test_otp.py
+"""
+In-memory OTP store and rate limiter (OTP_BACKEND=memory); the last test
+runs the Mongo store against mongomock-motor when it is installed:
+
+    uv run --with mongomock-motor pytest tests/test_otp.py
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("motor")
+
+from utils import otp  # noqa: E402
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = otp.MemoryOTPStore()
+    monkeypatch.setattr(otp, "_store", store)
+    monkeypatch.setattr(otp, "_ip_limiter", otp.RateLimiter(2, 60))
+    return store
+
+
+def test_resend_inside_window_is_throttled(store):
+    async def scenario():
+        await otp.issue_otp("+911")
+        await otp.issue_otp("+911")
+
+    with pytest.raises(otp.OTPThrottled) as error:
+        asyncio.run(scenario())
+    assert error.value.retry_after == otp.OTP_RESEND_SECONDS
+
+
+def test_resend_after_window_replaces_code(store, monkeypatch):
+    monkeypatch.setattr(otp, "OTP_RESEND_SECONDS", 0)
+
+    async def scenario():
+        await otp.issue_otp("+911")
+        return await otp.issue_otp("+911")
+
+    code = asyncio.run(scenario())
+    assert store.records["+911"]["otp"] == code
+
+
+def test_otp_is_single_use(store):
+    async def scenario():
+        code = await otp.issue_otp("+911")
+        record = await otp.verify_otp("+911", code)
+        assert record["verified"]
+        await otp.verify_otp("+911", code)
+
+    with pytest.raises(otp.OTPInvalid) as error:
+        asyncio.run(scenario())
+    assert not error.value.expired
+
+
+def test_wrong_code_is_rejected(store):
+    async def scenario():
+        code = await otp.issue_otp("+911")
+        await otp.verify_otp("+911", "000000" if code != "000000" else "111111")
+
+    with pytest.raises(otp.OTPInvalid):
+        asyncio.run(scenario())
+
+
+def test_expired_code_is_rejected_and_can_be_reissued(store):
+    async def scenario():
+        code = await otp.issue_otp("+911")
+        store.records["+911"]["expires_at"] = datetime.utcnow() - timedelta(seconds=1)
+        with pytest.raises(otp.OTPInvalid) as error:
+            await otp.verify_otp("+911", code)
+        assert error.value.expired
+        # An expired code doesn't hold the resend window
+        return await otp.issue_otp("+911")
+
+    code = asyncio.run(scenario())
+    assert store.records["+911"]["otp"] == code
+
+
+def test_ip_limit_applies_across_phones(store):
+    async def scenario():
+        await otp.issue_otp("+911", "10.0.0.1")
+        await otp.issue_otp("+912", "10.0.0.1")
+        # Another client still gets through
+        await otp.issue_otp("+913", "10.0.0.2")
+        await otp.issue_otp("+914", "10.0.0.1")
+
+    with pytest.raises(otp.OTPThrottled) as error:
+        asyncio.run(scenario())
+    assert 1 <= error.value.retry_after <= 61
+
+
+def test_rate_limiter_window_slides(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(otp.time, "monotonic", lambda: clock[0])
+    limiter = otp.RateLimiter(2, 60)
+
+    async def hits():
+        return [await limiter.hit("ip:a") for _ in range(3)]
+
+    assert asyncio.run(hits()) == [0, 0, 61]
+    clock[0] += 30
+    assert asyncio.run(limiter.hit("ip:a")) == 31
+    clock[0] += 31
+    assert asyncio.run(limiter.hit("ip:a")) == 0
+
+
+def test_mongo_store_dedupes_phones_before_unique_index(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()["test"]
+    monkeypatch.setattr(otp, "db", db)
+    later = datetime.utcnow() + timedelta(minutes=5)
+
+    async def scenario():
+        await db.otps.insert_many(
+            [
+                {"phone": "+911", "otp": "111111", "expires_at": later},
+                {"phone": "+911", "otp": "222222", "expires_at": later + timedelta(minutes=1)},
+                {"phone": "+912", "otp": "333333", "expires_at": later},
+            ]
+        )
+        await otp.MongoOTPStore().ensure_indexes()
+        return {doc["phone"]: doc["otp"] async for doc in db.otps.find()}
+
+    assert asyncio.run(scenario()) == {"+911": "222222", "+912": "333333"}
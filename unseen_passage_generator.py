@@ -13,9 +13,9 @@ from typing import List, Dict
 
 from fastapi import FastAPI, HTTPException, Body
 from pydantic import BaseModel, Field
-from langgraph.graph import StateGraph, END
-from openai import OpenAI
-from config import OPENAI_API_KEY, OPENAI_MODEL
+from config import OPENAI_API_KEY, OPENAI_MODEL, get_openai_client
+from utils import vectorIndex, contentVersion
+from utils.minhash import NearDuplicateFilter
 
 # -------------------------
 # Logging
@@ -29,8 +29,6 @@ logging.basicConfig(level=logging.INFO)
 if not OPENAI_API_KEY:
     raise ValueError("OPENAI_API_KEY missing in environment")
 
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
-
 
 # -------------------------
 # Pydantic Schemas
@@ -119,6 +117,7 @@ class State(dict):
     difficulty: str
     length: str
     passage_data: Dict
+    duplicate_of: str
 
 
 # -------------------------
@@ -133,7 +132,7 @@ def generate_passage(state: State):
         state["length"],
     )
 
-    response = openai_client.chat.completions.create(
+    response = get_openai_client().chat.completions.create(
         model=OPENAI_MODEL,
         messages=[{"role": "user", "content": prompt}],
         temperature=0.7,
@@ -158,10 +157,10 @@ def generate_passage(state: State):
 # -------------------------
 # Save to Mongo
 # -------------------------
-def save_to_mongo(state: State):
+def build_passage_record(state: State) -> dict:
+    """Shape generated passage data into the stored reading_passages document"""
     data = state["passage_data"]
-
-    record = {
+    return {
         "passage_id": str(uuid.uuid4()),
         "standard": state["standard"],
         "title": state["title"],
@@ -181,10 +180,39 @@ def save_to_mongo(state: State):
         "created_at": datetime.utcnow(),
     }
 
-    from main import app
 
-    app.state.mongodb_client.insert_documents("reading_passages", [record])
+def store_passages(mongodb_client, records: list):
+    """
+    Insert passage records, skipping near-duplicates of stored passages or of
+    each other, then index them for similarity search.
+    Returns (inserted_records, [(duplicate_record, existing_passage_id)]).
+    """
+    collection = mongodb_client.get_collection("reading_passages")
+    unique, duplicates = NearDuplicateFilter(collection, "passage", "passage_id").filter(
+        records
+    )
+    if not unique:
+        return unique, duplicates
+
+    mongodb_client.insert_documents("reading_passages", unique)
+    contentVersion.bump_sync(mongodb_client, "reading_passages")
+
+    # Add the passages to the similarity index
+    try:
+        vectorIndex.index_documents("reading_passages", unique)
+    except Exception as e:
+        logger.error(f"Failed to index {len(unique)} passage(s): {str(e)}")
 
+    return unique, duplicates
+
+
+def save_to_mongo(state: State):
+    from main import app
+
+    # Skip passages that near-duplicate one already stored
+    _, duplicates = store_passages(app.state.mongodb_client, [build_passage_record(state)])
+    if duplicates:
+        state["duplicate_of"] = duplicates[0][1]
     return state
     # return record
 
@@ -192,15 +220,25 @@ def save_to_mongo(state: State):
 # -------------------------
 # Build LangGraph
 # -------------------------
-graph = StateGraph(State)
-graph.add_node("generate", generate_passage)
-graph.add_node("save", save_to_mongo)
+_app_graph = None
+
+
+def get_app_graph():
+    """Compile the generate -> save graph on first use (langgraph is slow to import)"""
+    global _app_graph
+    if _app_graph is None:
+        from langgraph.graph import StateGraph, END
+
+        graph = StateGraph(State)
+        graph.add_node("generate", generate_passage)
+        graph.add_node("save", save_to_mongo)
 
-graph.set_entry_point("generate")
-graph.add_edge("generate", "save")
-graph.add_edge("save", END)
+        graph.set_entry_point("generate")
+        graph.add_edge("generate", "save")
+        graph.add_edge("save", END)
 
-app_graph = graph.compile()
+        _app_graph = graph.compile()
+    return _app_graph
 
 
 # -------------------------
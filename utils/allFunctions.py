@@ -1,25 +1,140 @@
-from sentence_transformers import SentenceTransformer  
-from sklearn.metrics.pairwise import cosine_similarity
+import os
+
+import numpy as np
+
+from utils.embeddingCache import EmbeddingCache
+
+# Any sentence-transformers model, e.g. a smaller "BAAI/bge-small-en-v1.5"
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-m3")
+# torch | torch-int8 | onnx | onnx-int8 (onnx needs sentence-transformers[onnx])
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+# Instruction set targeted by onnx-int8 quantization: arm64 | avx2 | avx512 | avx512_vnni
+EMBEDDING_ONNX_QUANTIZATION = os.getenv("EMBEDDING_ONNX_QUANTIZATION", "avx2")
+# Where exported/quantized ONNX models are kept so export happens once
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "cache/onnx")
+# Texts encoded per model call; larger batches amortize overhead on CPU
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 32))
+
+
+def embedding_tag(model_name: str = None, backend: str = None) -> str:
+    """Identify a model/backend pair; vectors from different pairs never mix"""
+    return f"{model_name or EMBEDDING_MODEL}-{backend or EMBEDDING_BACKEND}"
+
+
+def load_embedding_model(model_name: str = None, backend: str = None):
+    """Load the embedding model on CPU with the selected backend"""
+    # Imported here: sentence-transformers pulls in torch, which costs
+    # seconds at import time and is only needed once something is embedded
+    from sentence_transformers import SentenceTransformer
+
+    model_name = model_name or EMBEDDING_MODEL
+    backend = backend or EMBEDDING_BACKEND
+
+    if backend == "torch":
+        return SentenceTransformer(model_name, device="cpu")
+
+    if backend == "torch-int8":
+        import torch
+
+        model = SentenceTransformer(model_name, device="cpu")
+        # Dynamic quantization: int8 weights for every Linear layer
+        return torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+
+    if backend == "onnx":
+        return SentenceTransformer(model_name, backend="onnx", device="cpu")
+
+    if backend == "onnx-int8":
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        local_dir = os.path.join(EMBEDDING_ONNX_DIR, model_name.replace("/", "__"))
+        # Pass the suffix explicitly: the library's default depends on the
+        # weight dtype of each config (e.g. model_quint8_avx2.onnx)
+        file_suffix = f"int8_{EMBEDDING_ONNX_QUANTIZATION}"
+        file_name = f"onnx/model_{file_suffix}.onnx"
+        if not os.path.exists(os.path.join(local_dir, file_name)):
+            # Export once, then reuse the quantized file on every later start
+            model = SentenceTransformer(model_name, backend="onnx", device="cpu")
+            model.save(local_dir)
+            export_dynamic_quantized_onnx_model(
+                model, EMBEDDING_ONNX_QUANTIZATION, local_dir, file_suffix=file_suffix
+            )
+        return SentenceTransformer(
+            local_dir,
+            backend="onnx",
+            device="cpu",
+            model_kwargs={"file_name": file_name},
+        )
+
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+
 
 class AllFunctions:
-    def __init__(self):
-        self.model = SentenceTransformer('BAAI/bge-m3')
+    _model = None  # shared by every instance, loaded on first use
+    _cache = None
+
+    @property
+    def model(self):
+        if AllFunctions._model is None:
+            AllFunctions._model = load_embedding_model()
+        return AllFunctions._model
+
+    @property
+    def cache(self):
+        if AllFunctions._cache is None:
+            AllFunctions._cache = EmbeddingCache(embedding_tag())
+        return AllFunctions._cache
+
+    def embed_many(self, texts, batch_size=None, cache=True):
+        """
+        Embed many texts at once, returning an (n, dim) float32 array.
+        Texts already in the on-disk cache are never re-encoded; the rest are
+        de-duplicated, sorted by length and encoded in model batches.
+        With cache=False new vectors are not stored: use it for one-off texts
+        (student answers) so the cache only grows with catalog content.
+        """
+        texts = [text.lower() for text in texts]
+        keys = [EmbeddingCache.key(text) for text in texts]
+        vectors = self.cache.get_many(set(keys))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        if missing:
+            # Similar lengths in a batch means less padding work
+            order = sorted(missing, key=lambda key: len(missing[key]))
+            encoded = self.model.encode(
+                [missing[key] for key in order],
+                batch_size=batch_size or EMBEDDING_BATCH_SIZE,
+                normalize_embeddings=True,
+            )
+            if cache:
+                self.cache.put_many(order, encoded)
+            vectors.update(zip(order, np.asarray(encoded, dtype=np.float32)))
+
+        return np.stack([vectors[key] for key in keys]) if keys else np.empty((0, 0))
 
     def get_embedding(self, text):
-        """Get embedding from OpenAI API with caching"""
-        text = text.lower()
-        embedding = self.model.encode([text], normalize_embeddings=True)[0]
-        return embedding.tolist()  # Convert numpy array to list    
+        """Get a normalized embedding for one text (cached)"""
+        return self.embed_many([text])[0].tolist()  # Convert numpy array to list
 
     def semantic_similarity(self, embedding1, embedding2):
         """Returns semantic similarity between two titles (0 to 1)"""
+        from sklearn.metrics.pairwise import cosine_similarity
+
         return float(cosine_similarity([embedding1], [embedding2])[0][0])
-    
-    def get_similarity_score(self, text1, text2):
-        embedding1 = self.get_embedding(text1)
-        embedding2 = self.get_embedding(text2)
-        return self.semantic_similarity(embedding1, embedding2)
-    
+
+    def get_similarity_score(self, text1, text2, cache_second=True):
+        """Cosine similarity; pass cache_second=False when text2 is a one-off text"""
+        if cache_second:
+            embedding1, embedding2 = self.embed_many([text1, text2])
+        else:
+            embedding1 = self.embed_many([text1])[0]
+            embedding2 = self.embed_many([text2], cache=False)[0]
+        return float(np.dot(embedding1, embedding2))
+
     async def paginate(self, collection, query, projection, page: int, page_size: int):
         skip = (page - 1) * page_size
         cursor = collection.find(query, projection).skip(skip).limit(page_size)
@@ -34,4 +149,4 @@ class AllFunctions:
             "page_size": page_size,
             "total": total,
             "results": results
-        }
\ No newline at end of file
+        }
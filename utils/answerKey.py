@@ -0,0 +1,56 @@
+# utils/answerKey.py
+import logging
+
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+KEY_PROJECTION = {"answer": 1, "explanation": 1}
+
+# question_id (str) -> (normalized answer, answer, explanation)
+_keys = {}
+
+
+def normalize_answer(text) -> str:
+    return (text or "").lower().strip()
+
+
+def _entry(question: dict) -> tuple:
+    answer = question.get("answer")
+    return (normalize_answer(answer), answer, question.get("explanation"))
+
+
+def add(questions: list):
+    """Index questions that were just inserted (they must carry their _id)"""
+    for question in questions:
+        if question.get("_id") is not None:
+            _keys[str(question["_id"])] = _entry(question)
+
+
+async def load(db):
+    """Load the full answer key; the question bank is small enough to keep in memory"""
+    async for question in db.grammar_questions.find({}, KEY_PROJECTION):
+        _keys[str(question["_id"])] = _entry(question)
+    logger.info(f"Loaded answer key for {len(_keys)} grammar questions")
+
+
+async def get_many(db, question_ids: list) -> dict:
+    """
+    Return {question_id: (normalized answer, answer, explanation)} for the
+    ids that exist. Ids missing from memory (e.g. inserted by another
+    worker) are read through from Mongo in one query.
+    """
+    found = {qid: _keys[qid] for qid in question_ids if qid in _keys}
+    missing = [ObjectId(qid) for qid in set(question_ids) - set(found)]
+    if missing:
+        async for question in db.grammar_questions.find(
+            {"_id": {"$in": missing}}, KEY_PROJECTION
+        ):
+            qid = str(question["_id"])
+            _keys[qid] = found[qid] = _entry(question)
+    return found
+
+
+async def get(db, question_id: str):
+    """Answer key entry for one question, or None if it does not exist"""
+    return (await get_many(db, [question_id])).get(question_id)
@@ -0,0 +1,110 @@
+# utils/contentVersion.py
+import hashlib
+import os
+import time
+
+from fastapi import Request, Response
+from pymongo import ReturnDocument
+
+from database import db
+from utils import responses
+
+# How long a worker trusts its cached counters before re-reading them;
+# bumps made by this worker are seen immediately
+CONTENT_VERSION_CACHE_SECONDS = float(os.getenv("CONTENT_VERSION_CACHE_SECONDS", 2))
+
+_versions = {}  # name -> (read_at, version)
+
+
+def user_key(collection: str, user_id: str) -> str:
+    """Counter name for one user's writes to a collection (e.g. their submissions)"""
+    return f"{collection}:{user_id}"
+
+
+async def get_versions(names: list) -> dict:
+    """Current counter for each name (0 if never bumped), one query for stale names"""
+    now = time.monotonic()
+    versions = {}
+    stale = []
+    for name in names:
+        cached = _versions.get(name)
+        if cached and now - cached[0] < CONTENT_VERSION_CACHE_SECONDS:
+            versions[name] = cached[1]
+        else:
+            stale.append(name)
+    if stale:
+        found = {
+            doc["_id"]: doc["version"]
+            async for doc in db.content_versions.find({"_id": {"$in": stale}})
+        }
+        for name in stale:
+            versions[name] = found.get(name, 0)
+            _versions[name] = (now, versions[name])
+    return versions
+
+
+async def bump(*names):
+    """Mark content as changed (async callers)"""
+    for name in names:
+        doc = await db.content_versions.find_one_and_update(
+            {"_id": name},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        _versions[name] = (time.monotonic(), doc["version"])
+
+
+def bump_sync(mongodb_client, *names):
+    """Mark content as changed (sync code using the pymongo client)"""
+    collection = mongodb_client.get_collection("content_versions")
+    for name in names:
+        doc = collection.find_one_and_update(
+            {"_id": name},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        _versions[name] = (time.monotonic(), doc["version"])
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = set()
+    for tag in if_none_match.split(","):
+        tag = tag.strip().removeprefix("W/")
+        # CompressionMiddleware tags each encoding, e.g. "abc-gzip"
+        for suffix in ('-gzip"', '-br"'):
+            if tag.endswith(suffix):
+                tag = tag[: -len(suffix)] + '"'
+        tags.add(tag)
+    return "*" in tags or etag in tags
+
+
+async def conditional(request: Request, response: Response, *names):
+    """
+    Set a strong ETag derived from the URL and the named counters. Returns
+    a 304 response to send as-is when the client's If-None-Match matches,
+    otherwise None and the endpoint runs its query as usual.
+    """
+    versions = await get_versions(list(names))
+    # JSON and MessagePack bodies are different representations
+    basis = "|".join(
+        [
+            request.url.path,
+            str(sorted(request.query_params.multi_items())),
+            responses.negotiated_media_type(),
+        ]
+        + [f"{name}={versions[name]}" for name in names]
+    )
+    etag = '"' + hashlib.sha1(basis.encode("utf-8")).hexdigest()[:24] + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if _matches(request.headers.get("if-none-match"), etag):
+        if responses.msgpack is not None:
+            # ORJSONResponse sends the same Vary on full responses
+            headers["Vary"] = "Accept"
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
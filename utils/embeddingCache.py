@@ -0,0 +1,97 @@
+# utils/embeddingCache.py
+import fcntl
+import hashlib
+import os
+import re
+import threading
+
+import numpy as np
+
+from utils.mmapMatrix import MmapMatrix, append_lines
+
+# Where cached embeddings are kept between restarts
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "cache/embeddings")
+
+
+class EmbeddingCache:
+    """
+    Content-hash keyed embedding cache on disk.
+    Vectors are appended to a memory-mapped float32 file; a text file holds
+    one "key dim row" record per vector, written after the row, so a crash
+    in between only leaves an unreferenced row. One cache per model, so
+    switching models never returns stale vectors.
+    """
+
+    def __init__(self, model_name: str, directory: str = None):
+        directory = directory or EMBEDDING_CACHE_DIR
+        os.makedirs(directory, exist_ok=True)
+        name = re.sub(r"[^\w.-]", "_", model_name)
+        self.keys_path = os.path.join(directory, f"{name}.keys")
+        self.lock_path = os.path.join(directory, f"{name}.lock")
+        self.matrix = MmapMatrix(os.path.join(directory, f"{name}.vec"), np.float32)
+        self.dim = None
+        self.rows = {}
+        self._keys_offset = 0
+        self._key_lines = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def refresh(self):
+        """Pick up rows appended by this or another process"""
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        # Caller holds self._lock
+        if not os.path.exists(self.keys_path):
+            return
+        with open(self.keys_path, "r", encoding="ascii") as f:
+            f.seek(self._keys_offset)
+            lines = [line for line in f.readlines() if line.endswith("\n")]
+            self._keys_offset += sum(len(line) for line in lines)
+        for line in lines:
+            fields = line.split()
+            # Records written before row numbers were stored are sequential
+            row = int(fields[2]) if len(fields) > 2 else self._key_lines
+            self._key_lines += 1
+            self.dim = int(fields[1])
+            self.rows[fields[0]] = row
+
+    def get_many(self, keys) -> dict:
+        """Return {key: vector} for the keys that are cached"""
+        with self._lock:
+            self._refresh()
+            found = {key: self.rows[key] for key in keys if key in self.rows}
+            if not found:
+                return {}
+            matrix = self.matrix.view(self.dim)
+            return {
+                key: np.array(matrix[row])
+                for key, row in found.items()
+                if row < matrix.shape[0]
+            }
+
+    def put_many(self, keys: list, vectors: np.ndarray):
+        """Append new vectors, skipping keys another process already added"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock, open(self.lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                new = [i for i, key in enumerate(keys) if key not in self.rows]
+                if not new:
+                    return
+                start = self.matrix.append(vectors[new])
+                append_lines(
+                    self.keys_path,
+                    "".join(
+                        f"{keys[i]} {vectors.shape[1]} {start + n}\n"
+                        for n, i in enumerate(new)
+                    ),
+                )
+                self._refresh()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,234 @@
+# utils/evaluationQueue.py
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Number of evaluations processed concurrently by this app process
+EVALUATION_WORKERS = int(os.getenv("EVALUATION_WORKERS", 4))
+# A job left "running" longer than this (e.g. the process crashed) is re-queued
+RUNNING_LEASE_SECONDS = int(os.getenv("EVALUATION_RUNNING_LEASE_SECONDS", 600))
+# How often a worker renews the lease on the job it is running
+LEASE_RENEW_SECONDS = RUNNING_LEASE_SECONDS / 3
+# How often each process looks for jobs abandoned by a dead worker
+SWEEP_INTERVAL_SECONDS = int(os.getenv("EVALUATION_SWEEP_INTERVAL_SECONDS", 60))
+# Finished jobs are deleted this long after they complete or fail
+FINISHED_JOB_TTL_SECONDS = int(os.getenv("EVALUATION_FINISHED_JOB_TTL_SECONDS", 7 * 24 * 60 * 60))
+POLL_INTERVAL_SECONDS = 2.0
+
+FINISHED_STATUSES = ("completed", "failed")
+
+_handlers = {}
+_queue = None
+_workers = []
+_events = {}
+
+
+class EvaluationError(Exception):
+    """An evaluation failed in a way that should be reported to the client"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+def register_handler(kind: str, handler):
+    """Register the coroutine `handler(user_id, payload) -> dict` for a job kind"""
+    _handlers[kind] = handler
+
+
+async def ensure_indexes():
+    await db.evaluation_jobs.create_index("job_id", unique=True)
+    await db.evaluation_jobs.create_index([("status", 1), ("updated_at", 1)])
+    # Only finished jobs have expires_at, so queued/running ones never expire
+    await db.evaluation_jobs.create_index("expires_at", expireAfterSeconds=0)
+    # Jobs finished before expires_at existed
+    await db.evaluation_jobs.update_many(
+        {"status": {"$in": list(FINISHED_STATUSES)}, "expires_at": {"$exists": False}},
+        [{"$set": {"expires_at": {"$add": ["$updated_at", FINISHED_JOB_TTL_SECONDS * 1000]}}}],
+    )
+
+
+async def submit(kind: str, user_id: str, payload: dict) -> str:
+    """Store a submission and queue it for the local worker pool"""
+    now = datetime.utcnow()
+    job_id = str(uuid.uuid4())
+    await db.evaluation_jobs.insert_one(
+        {
+            "job_id": job_id,
+            "kind": kind,
+            "user_id": user_id,
+            "payload": payload,
+            "status": "queued",
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+    )
+    _events[job_id] = asyncio.Event()
+    _queue.put_nowait(job_id)
+    return job_id
+
+
+async def get_job(job_id: str, user_id: str):
+    """Return a job's public status/result, or None if it is not the user's"""
+    return await db.evaluation_jobs.find_one(
+        {"job_id": job_id, "user_id": user_id},
+        {"_id": 0, "payload": 0},
+    )
+
+
+async def wait_for(job_id: str, user_id: str, timeout: float):
+    """
+    Wait until a job finishes (or `timeout` seconds pass) and return it.
+    Local jobs wake up immediately; jobs owned by other processes are polled.
+    """
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        job = await get_job(job_id, user_id)
+        if job is None or job["status"] in FINISHED_STATUSES:
+            return job
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            return job
+        event = _events.get(job_id)
+        try:
+            if event is not None:
+                await asyncio.wait_for(event.wait(), min(remaining, POLL_INTERVAL_SECONDS))
+            else:
+                await asyncio.sleep(min(remaining, POLL_INTERVAL_SECONDS))
+        except asyncio.TimeoutError:
+            pass
+
+
+async def start():
+    """Start the worker pool and pick up jobs left over from a previous run"""
+    global _queue
+    # Before the queue exists: the queued jobs are all enqueued just below
+    await requeue_stale()
+    _queue = asyncio.Queue()
+
+    async for job in db.evaluation_jobs.find({"status": "queued"}, {"job_id": 1}):
+        _queue.put_nowait(job["job_id"])
+
+    for _ in range(EVALUATION_WORKERS):
+        _workers.append(asyncio.create_task(_worker()))
+    _workers.append(asyncio.create_task(_sweeper()))
+
+
+async def requeue_stale() -> int:
+    """
+    Queue jobs here that were abandoned elsewhere: "running" past the lease
+    (the worker died mid-job) or "queued" that long (the process holding
+    them in memory died). Each job is taken with one atomic update, so only
+    one process picks it up; returns how many were taken.
+    """
+    taken = 0
+    for status in ("running", "queued"):
+        while True:
+            now = datetime.utcnow()
+            job = await db.evaluation_jobs.find_one_and_update(
+                {
+                    "status": status,
+                    "updated_at": {"$lt": now - timedelta(seconds=RUNNING_LEASE_SECONDS)},
+                },
+                {"$set": {"status": "queued", "lease_id": None, "updated_at": now}},
+                {"job_id": 1},
+            )
+            if job is None:
+                break
+            taken += 1
+            if _queue is not None:
+                _queue.put_nowait(job["job_id"])
+    if taken:
+        logger.info(f"Re-queued {taken} abandoned evaluation job(s)")
+    return taken
+
+
+async def _sweeper():
+    while True:
+        await asyncio.sleep(SWEEP_INTERVAL_SECONDS)
+        try:
+            await requeue_stale()
+        except Exception as e:
+            logger.error(f"Evaluation job sweep failed: {str(e)}")
+
+
+async def stop():
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+
+async def _worker():
+    while True:
+        job_id = await _queue.get()
+        try:
+            await _process(job_id)
+        except Exception as e:
+            logger.error(f"Evaluation job {job_id} crashed: {str(e)}")
+        finally:
+            _queue.task_done()
+            event = _events.pop(job_id, None)
+            if event is not None:
+                event.set()
+
+
+async def _renew_lease(job_id: str, lease_id: str):
+    """Keep a running job's lease fresh so the sweeper doesn't hand it out again"""
+    while True:
+        await asyncio.sleep(LEASE_RENEW_SECONDS)
+        try:
+            renewed = await db.evaluation_jobs.update_one(
+                {"job_id": job_id, "lease_id": lease_id},
+                {"$set": {"updated_at": datetime.utcnow()}},
+            )
+        except Exception as e:
+            logger.error(f"Renewing lease on evaluation job {job_id} failed: {str(e)}")
+            continue
+        if renewed.matched_count == 0:
+            logger.warning(f"Lost the lease on evaluation job {job_id}")
+            return
+
+
+async def _process(job_id: str):
+    # Claim atomically so a job is only ever run by one process; the
+    # lease_id marks this claim so a stale owner can't overwrite the result
+    lease_id = str(uuid.uuid4())
+    job = await db.evaluation_jobs.find_one_and_update(
+        {"job_id": job_id, "status": "queued"},
+        {"$set": {"status": "running", "lease_id": lease_id, "updated_at": datetime.utcnow()}},
+    )
+    if job is None:
+        return
+
+    renewer = asyncio.create_task(_renew_lease(job_id, lease_id))
+    update = {"updated_at": datetime.utcnow()}
+    try:
+        handler = _handlers[job["kind"]]
+        update["result"] = await handler(job["user_id"], job["payload"])
+        update["status"] = "completed"
+    except EvaluationError as e:
+        update["status"] = "failed"
+        update["error"] = e.message
+    except Exception as e:
+        update["status"] = "failed"
+        update["error"] = f"Server error: {str(e)}"
+    finally:
+        renewer.cancel()
+
+    update["updated_at"] = datetime.utcnow()
+    update["expires_at"] = update["updated_at"] + timedelta(seconds=FINISHED_JOB_TTL_SECONDS)
+    saved = await db.evaluation_jobs.update_one(
+        {"job_id": job_id, "lease_id": lease_id}, {"$set": update}
+    )
+    if saved.matched_count == 0:
+        logger.warning(f"Discarded result of evaluation job {job_id}: its lease was taken over")
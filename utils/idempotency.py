@@ -0,0 +1,137 @@
+# utils/idempotency.py
+import asyncio
+import hashlib
+import os
+import re
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+
+# How long completed evaluations are remembered for retries
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 24 * 60 * 60))
+# A pending claim older than this is treated as abandoned (crashed worker)
+PENDING_LEASE_SECONDS = int(os.getenv("IDEMPOTENCY_PENDING_LEASE_SECONDS", 120))
+# How long a retry waits for an in-flight evaluation before giving up
+IN_FLIGHT_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_IN_FLIGHT_WAIT_SECONDS", 30))
+POLL_INTERVAL_SECONDS = 0.5
+
+
+class EvaluationInProgress(Exception):
+    """Raised when the same evaluation is still running elsewhere"""
+
+
+class IdempotencyKeyReused(Exception):
+    """Raised when an Idempotency-Key is sent again with a different payload"""
+
+
+async def ensure_indexes():
+    """Unique key per request plus TTL expiry of old entries"""
+    await db.evaluation_requests.create_index("key", unique=True)
+    await db.evaluation_requests.create_index(
+        "created_at", expireAfterSeconds=IDEMPOTENCY_TTL_SECONDS
+    )
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace so trivial differences don't matter"""
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+
+def payload_hash(user_id: str, topic_id: str, text: str) -> str:
+    """Fingerprint of (user, topic_id, normalized answer)"""
+    return hashlib.sha256(
+        "\x1f".join([user_id, topic_id, normalize_text(text)]).encode("utf-8")
+    ).hexdigest()
+
+
+def request_key(kind: str, user_id: str, topic_id: str, text: str, idempotency_key=None):
+    """
+    Build the dedupe key for an evaluation.
+    Uses the client's Idempotency-Key header when present, otherwise the
+    payload fingerprint.
+    """
+    if idempotency_key:
+        return f"{kind}:{user_id}:key:{idempotency_key.strip()}"
+    return f"{kind}:{user_id}:fp:{payload_hash(user_id, topic_id, text)}"
+
+
+async def claim(key: str, fingerprint: str = None):
+    """
+    Try to claim an evaluation.
+    Returns None when the caller should run the evaluation, or the stored
+    result when an identical evaluation already completed. Raises
+    EvaluationInProgress if it is still running after waiting, and
+    IdempotencyKeyReused if the key was stored with another payload.
+    """
+    now = datetime.utcnow()
+    try:
+        await db.evaluation_requests.insert_one(
+            {"key": key, "status": "pending", "payload_hash": fingerprint, "created_at": now}
+        )
+        return None
+    except DuplicateKeyError:
+        pass
+
+    deadline = now + timedelta(seconds=IN_FLIGHT_WAIT_SECONDS)
+    while True:
+        existing = await db.evaluation_requests.find_one({"key": key})
+        if existing is None:
+            # Previous attempt failed and released its claim - take it over
+            try:
+                await db.evaluation_requests.insert_one(
+                    {
+                        "key": key,
+                        "status": "pending",
+                        "payload_hash": fingerprint,
+                        "created_at": datetime.utcnow(),
+                    }
+                )
+                return None
+            except DuplicateKeyError:
+                continue
+
+        stored_hash = existing.get("payload_hash")
+        if fingerprint and stored_hash and stored_hash != fingerprint:
+            raise IdempotencyKeyReused(key)
+
+        if existing["status"] == "completed":
+            return existing["result"]
+
+        # Take over claims left behind by a crashed request
+        stale = await db.evaluation_requests.find_one_and_update(
+            {
+                "key": key,
+                "status": "pending",
+                "created_at": {
+                    "$lt": datetime.utcnow() - timedelta(seconds=PENDING_LEASE_SECONDS)
+                },
+            },
+            {"$set": {"created_at": datetime.utcnow()}},
+        )
+        if stale:
+            return None
+
+        if datetime.utcnow() >= deadline:
+            raise EvaluationInProgress(key)
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+
+async def complete(key: str, result):
+    """Store the finished result so retries get it back"""
+    await db.evaluation_requests.update_one(
+        {"key": key},
+        {
+            "$set": {
+                "status": "completed",
+                "result": result,
+                "created_at": datetime.utcnow(),
+            }
+        },
+    )
+
+
+async def release(key: str):
+    """Drop a pending claim after a failed evaluation so it can be retried"""
+    await db.evaluation_requests.delete_one({"key": key, "status": "pending"})
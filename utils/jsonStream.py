@@ -0,0 +1,51 @@
+# utils/jsonStream.py
+import json
+import re
+
+_MISSING = object()
+
+
+class JSONFieldStream:
+    """
+    Pull completed fields out of a JSON object while it is still being streamed.
+    Feed raw text chunks in; get back (field, value) pairs as soon as each
+    value has been fully generated.
+    """
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self.buffer = ""
+        self.emitted = set()
+        self._decoder = json.JSONDecoder()
+
+    def feed(self, chunk: str):
+        """Add a chunk and return the fields that became complete"""
+        self.buffer += chunk
+        found = []
+        for name in self.fields:
+            if name in self.emitted:
+                continue
+            value = self._extract(name)
+            if value is _MISSING:
+                continue
+            self.emitted.add(name)
+            found.append((name, value))
+        return found
+
+    def _extract(self, name: str):
+        match = re.search(r'"%s"\s*:\s*' % re.escape(name), self.buffer)
+        if not match:
+            return _MISSING
+        try:
+            value, end = self._decoder.raw_decode(self.buffer, match.end())
+        except ValueError:
+            return _MISSING
+        # A number at the very end of the buffer may still be growing ("8" -> "85")
+        if end >= len(self.buffer):
+            return _MISSING
+        return value
+
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
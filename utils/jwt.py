@@ -36,4 +36,13 @@ async def get_current_user(token: str = Depends(auth_scheme)):
     user_id = verify_access_token(token.credentials)
     if not user_id:
         raise HTTPException(401, "Invalid or expired token")
-    return user_id
\ No newline at end of file
+    return user_id
+
+# Comma-separated user ids allowed to use admin endpoints
+ADMIN_USER_IDS = {u.strip() for u in os.getenv("ADMIN_USER_IDS", "").split(",") if u.strip()}
+
+
+async def get_admin_user(user_id: str = Depends(get_current_user)):
+    if user_id not in ADMIN_USER_IDS:
+        raise HTTPException(403, "Admin access required")
+    return user_id
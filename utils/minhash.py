@@ -0,0 +1,168 @@
+# utils/minhash.py
+import hashlib
+import logging
+import os
+import re
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 128
+BANDS = 32  # 32 bands x 4 rows: ~50% hit rate at Jaccard 0.7, >99% at 0.9
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5  # character shingles work for short questions as well as passages
+
+# Jaccard estimate at or above which two texts are treated as duplicates
+DEDUPE_THRESHOLD = float(os.getenv("DEDUPE_THRESHOLD", 0.8))
+# Short texts (fill-in templates) share most shingles after a one-word edit,
+# so they need a stricter threshold
+DEDUPE_SHORT_TEXT_CHARS = int(os.getenv("DEDUPE_SHORT_TEXT_CHARS", 120))
+DEDUPE_SHORT_THRESHOLD = float(os.getenv("DEDUPE_SHORT_THRESHOLD", 0.95))
+# Optionally confirm borderline candidates with embedding similarity
+DEDUPE_EMBEDDING_CHECK = os.getenv("DEDUPE_EMBEDDING_CHECK", "false").lower() == "true"
+DEDUPE_EMBEDDING_MIN_JACCARD = float(os.getenv("DEDUPE_EMBEDDING_MIN_JACCARD", 0.5))
+DEDUPE_EMBEDDING_THRESHOLD = float(os.getenv("DEDUPE_EMBEDDING_THRESHOLD", 0.95))
+
+_PRIME = np.uint64(4294967291)  # largest prime below 2^32, keeps a*h+b inside uint64
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 2**32 - 5, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 2**32 - 5, size=NUM_PERM, dtype=np.uint64)
+
+
+def normalize(text: str) -> str:
+    text = re.sub(r"[^\w\s]", " ", (text or "").lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def signature(text: str) -> list:
+    """MinHash signature (NUM_PERM ints) of the text's character shingles"""
+    text = normalize(text)
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {text[i : i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    hashes = np.array(
+        [
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+            for s in shingles
+        ],
+        dtype=np.uint64,
+    )
+    permuted = (np.outer(hashes, _A) + _B) % _PRIME
+    return permuted.min(axis=0).tolist()
+
+
+def bands(sig: list) -> list:
+    """LSH band keys; texts sharing any key are candidate duplicates"""
+    keys = []
+    for band in range(BANDS):
+        rows = sig[band * ROWS : (band + 1) * ROWS]
+        digest = hashlib.blake2b(
+            ",".join(map(str, rows)).encode("utf-8"), digest_size=8
+        ).hexdigest()
+        keys.append(f"{band}:{digest}")
+    return keys
+
+
+def jaccard(sig1: list, sig2: list) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for a, b in zip(sig1, sig2) if a == b) / NUM_PERM
+
+
+def ensure_indexes(mongodb_client):
+    """Multikey index on band keys so candidate lookup is an index seek"""
+    for name in ("grammar_questions", "reading_passages"):
+        mongodb_client.get_collection(name).create_index("minhash_bands")
+
+
+class NearDuplicateFilter:
+    """
+    Drop records that are near-duplicates of stored documents or of each other.
+    `text_fields` names the field (or fields, joined in order) that are
+    compared. Accepted records get `minhash` and `minhash_bands` fields for
+    future checks.
+    """
+
+    def __init__(self, collection, text_fields, id_field: str):
+        self.collection = collection
+        self.text_fields = [text_fields] if isinstance(text_fields, str) else list(text_fields)
+        self.id_field = id_field
+
+    def text(self, record: dict) -> str:
+        parts = []
+        for field in self.text_fields:
+            value = record.get(field)
+            if isinstance(value, (list, tuple)):
+                parts.extend(str(item) for item in value)
+            elif value is not None:
+                parts.append(str(value))
+        return " ".join(parts)
+
+    def filter(self, records: list, scope: dict = None):
+        """Return (unique_records, [(duplicate_record, existing_id)])"""
+        unique, duplicates = [], []
+        batch_bands = {}
+        for record in records:
+            text = self.text(record)
+            sig = signature(text)
+            keys = bands(sig)
+            threshold = (
+                DEDUPE_SHORT_THRESHOLD
+                if len(normalize(text)) < DEDUPE_SHORT_TEXT_CHARS
+                else DEDUPE_THRESHOLD
+            )
+
+            # Duplicates inside this batch
+            existing_id = None
+            for key in keys:
+                for other in batch_bands.get(key, []):
+                    if self._is_duplicate(sig, text, other, threshold):
+                        existing_id = other[self.id_field]
+                        break
+                if existing_id:
+                    break
+
+            # Duplicates already stored
+            if existing_id is None:
+                existing_id = self._find_stored(sig, keys, text, threshold, scope or {})
+
+            if existing_id is not None:
+                duplicates.append((record, existing_id))
+                continue
+
+            record["minhash"] = sig
+            record["minhash_bands"] = keys
+            unique.append(record)
+            for key in keys:
+                batch_bands.setdefault(key, []).append(record)
+
+        if duplicates:
+            logger.info(
+                f"Skipped {len(duplicates)} near-duplicate(s) for {self.collection.name}"
+            )
+        return unique, duplicates
+
+    def _find_stored(self, sig, keys, text, threshold, scope):
+        # Every stored document sharing a band key is a candidate; the scope
+        # keeps that set small, so none are cut off before being compared
+        projection = {"_id": 0, self.id_field: 1, "minhash": 1}
+        projection.update({field: 1 for field in self.text_fields})
+        candidates = self.collection.find(
+            {"minhash_bands": {"$in": keys}, **scope}, projection
+        )
+        for candidate in candidates:
+            if self._is_duplicate(sig, text, candidate, threshold):
+                return candidate[self.id_field]
+        return None
+
+    def _is_duplicate(self, sig, text, other, threshold) -> bool:
+        score = jaccard(sig, other["minhash"])
+        if score >= threshold:
+            return True
+        if DEDUPE_EMBEDDING_CHECK and score >= DEDUPE_EMBEDDING_MIN_JACCARD:
+            from utils.allFunctions import AllFunctions
+
+            similarity = AllFunctions().get_similarity_score(text, self.text(other))
+            return similarity >= DEDUPE_EMBEDDING_THRESHOLD
+        return False
@@ -0,0 +1,68 @@
+# utils/mmapMatrix.py
+import os
+
+import numpy as np
+
+
+class MmapMatrix:
+    """
+    Append-only matrix of fixed-width rows stored in one file.
+    Reads go through np.memmap so worker processes share the same pages.
+    """
+
+    def __init__(self, path: str, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.dim = None
+        self._view = None
+        self._size = -1
+
+    def _row_bytes(self):
+        return self.dim * self.dtype.itemsize
+
+    def append(self, rows: np.ndarray) -> int:
+        """
+        Append rows and return the index of the first one; caller must hold
+        the file lock when sharing the file. A partial row left by a crashed
+        writer is cut off first so rows stay aligned.
+        """
+        rows = np.ascontiguousarray(rows, dtype=self.dtype)
+        self.dim = rows.shape[1]
+        with open(self.path, "ab") as f:
+            size = f.seek(0, os.SEEK_END)
+            start, partial = divmod(size, self._row_bytes())
+            if partial:
+                f.truncate(start * self._row_bytes())
+            f.write(rows.tobytes())
+        return start
+
+    def view(self, dim: int) -> np.ndarray:
+        """Return a read-only (rows, dim) view, remapping if the file grew"""
+        self.dim = dim
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if size != self._size:
+            rows = size // self._row_bytes()
+            if rows == 0:
+                self._view = np.empty((0, dim), dtype=self.dtype)
+            else:
+                self._view = np.memmap(
+                    self.path, dtype=self.dtype, mode="r", shape=(rows, dim)
+                )
+            self._size = size
+        return self._view
+
+
+def append_lines(path: str, text: str):
+    """
+    Append newline-terminated records to a text file; caller must hold the
+    file lock. A torn last line left by a crashed writer is dropped first.
+    """
+    with open(path, "a+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size:
+            tail_start = max(0, size - 65536)
+            f.seek(tail_start)
+            tail = f.read()
+            if not tail.endswith(b"\n"):
+                f.truncate(tail_start + tail.rfind(b"\n") + 1)
+        f.write(text.encode("utf-8"))
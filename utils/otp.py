@@ -0,0 +1,270 @@
+# utils/otp.py
+import os
+import random
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from database import db
+
+# How long an issued OTP stays valid
+OTP_TTL_SECONDS = int(os.getenv("OTP_TTL_SECONDS", 5 * 60))
+# Minimum gap between two OTPs sent to the same phone
+OTP_RESEND_SECONDS = int(os.getenv("OTP_RESEND_SECONDS", 60))
+# Sends allowed per client IP within the window (shared by all workers)
+OTP_IP_MAX_SENDS = int(os.getenv("OTP_IP_MAX_SENDS", 10))
+OTP_IP_WINDOW_SECONDS = int(os.getenv("OTP_IP_WINDOW_SECONDS", 10 * 60))
+# Proxies/load balancers in front of the app that append to X-Forwarded-For;
+# 0 trusts no header and uses the socket peer address
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", 0))
+# mongo | memory (single process, for tests and local runs)
+OTP_BACKEND = os.getenv("OTP_BACKEND", "mongo")
+
+
+class OTPThrottled(Exception):
+    """Raised when an OTP was requested again too soon"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Too many OTP requests, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class OTPInvalid(Exception):
+    """Raised when an OTP does not match, was already used or has expired"""
+
+    def __init__(self, expired: bool = False):
+        super().__init__("OTP expired" if expired else "Invalid OTP")
+        self.expired = expired
+
+
+def generate_otp() -> str:
+    return str(random.SystemRandom().randint(100000, 999999))
+
+
+def client_ip(request):
+    """
+    The caller's address. Behind TRUSTED_PROXY_HOPS proxies it is the entry
+    that many positions from the right of X-Forwarded-For; entries further
+    left are client-supplied and could be forged.
+    """
+    if TRUSTED_PROXY_HOPS > 0:
+        forwarded = [
+            part.strip()
+            for part in request.headers.get("x-forwarded-for", "").split(",")
+            if part.strip()
+        ]
+        if forwarded:
+            return forwarded[-min(TRUSTED_PROXY_HOPS, len(forwarded))]
+    return request.client.host if request.client else None
+
+
+class MongoRateLimiter:
+    """
+    Fixed-window counter per key in `otp_rate_limits`, shared by every
+    worker. One document per (key, window), removed by a TTL index.
+    """
+
+    def __init__(self, limit: int, window_seconds: int):
+        self.limit = limit
+        self.window = window_seconds
+
+    async def ensure_indexes(self):
+        await db.otp_rate_limits.create_index("expires_at", expireAfterSeconds=0)
+
+    async def hit(self, key: str) -> int:
+        """Record a hit; return 0 if allowed, else seconds until the next slot"""
+        now = time.time()
+        window_start = int(now // self.window) * self.window
+        window_end = window_start + self.window
+        for attempt in range(2):
+            try:
+                doc = await db.otp_rate_limits.find_one_and_update(
+                    {"_id": f"{key}:{window_start}"},
+                    {
+                        "$inc": {"count": 1},
+                        "$setOnInsert": {"expires_at": datetime.utcfromtimestamp(window_end)},
+                    },
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+                break
+            except DuplicateKeyError:
+                # Two first hits in the same window raced on the upsert
+                if attempt:
+                    raise
+        if doc["count"] > self.limit:
+            return max(1, int(window_end - now) + 1)
+        return 0
+
+
+class RateLimiter:
+    """Sliding-window counter per key, kept in process memory (OTP_BACKEND=memory)"""
+
+    def __init__(self, limit: int, window_seconds: int):
+        self.limit = limit
+        self.window = window_seconds
+        self.hits = {}
+
+    async def ensure_indexes(self):
+        pass
+
+    async def hit(self, key: str) -> int:
+        """Record a hit; return 0 if allowed, else seconds until the next slot"""
+        now = time.monotonic()
+        hits = self.hits.setdefault(key, deque())
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+        if len(hits) >= self.limit:
+            return max(1, int(hits[0] + self.window - now) + 1)
+        hits.append(now)
+        if len(self.hits) > 10000:
+            # Forget idle keys so the table stays bounded
+            self.hits = {k: v for k, v in self.hits.items() if v and v[-1] > now - self.window}
+        return 0
+
+
+class MongoOTPStore:
+    """
+    One document per phone in `otps`, replaced atomically on every send.
+    A TTL index removes expired codes; the unique phone index turns a send
+    inside the resend window into a DuplicateKeyError instead of a write.
+    """
+
+    async def ensure_indexes(self):
+        indexes = await db.otps.index_information()
+        if not any(
+            index.get("unique") and index["key"] == [("phone", 1)] for index in indexes.values()
+        ):
+            # Older code inserted a document per send, so a phone can have several
+            for attempt in range(2):
+                await self._drop_duplicate_phones()
+                try:
+                    await db.otps.create_index("phone", unique=True)
+                    break
+                except OperationFailure:
+                    # A worker still on the old code inserted a duplicate meanwhile
+                    if attempt:
+                        raise
+        await db.otps.create_index("expires_at", expireAfterSeconds=0)
+
+    async def _drop_duplicate_phones(self):
+        """Keep only the newest OTP document per phone"""
+        duplicates = db.otps.aggregate(
+            [
+                {"$sort": {"expires_at": -1, "_id": -1}},
+                {"$group": {"_id": "$phone", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+                {"$match": {"count": {"$gt": 1}}},
+            ],
+            allowDiskUse=True,
+        )
+        async for group in duplicates:
+            await db.otps.delete_many({"_id": {"$in": group["ids"][1:]}})
+
+    async def issue(self, phone) -> str:
+        now = datetime.utcnow()
+        otp = generate_otp()
+        try:
+            await db.otps.find_one_and_update(
+                {
+                    "phone": phone,
+                    "$or": [
+                        {"sent_at": {"$lte": now - timedelta(seconds=OTP_RESEND_SECONDS)}},
+                        {"sent_at": {"$exists": False}},
+                    ],
+                },
+                {
+                    "$set": {
+                        "otp": otp,
+                        "sent_at": now,
+                        "expires_at": now + timedelta(seconds=OTP_TTL_SECONDS),
+                        "verified": False,
+                    }
+                },
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # A recent OTP exists for this phone, so the filter missed and the upsert collided
+            raise OTPThrottled(OTP_RESEND_SECONDS)
+        return otp
+
+    async def verify(self, phone, otp: str):
+        now = datetime.utcnow()
+        record = await db.otps.find_one_and_update(
+            {"phone": phone, "otp": otp, "verified": False, "expires_at": {"$gt": now}},
+            {"$set": {"verified": True, "verified_at": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if record is None:
+            # Failure path only: tell an expired code from a wrong one
+            stale = await db.otps.find_one({"phone": phone, "otp": otp, "verified": False})
+            raise OTPInvalid(expired=stale is not None)
+        return record
+
+
+class MemoryOTPStore:
+    """In-process store with the same behaviour, for tests (OTP_BACKEND=memory)"""
+
+    def __init__(self):
+        self.records = {}
+
+    async def ensure_indexes(self):
+        pass
+
+    async def issue(self, phone) -> str:
+        now = datetime.utcnow()
+        record = self.records.get(phone)
+        if record:
+            if record["expires_at"] <= now:
+                record = None
+            elif record["sent_at"] > now - timedelta(seconds=OTP_RESEND_SECONDS):
+                raise OTPThrottled(OTP_RESEND_SECONDS)
+        otp = generate_otp()
+        self.records[phone] = {
+            "phone": phone,
+            "otp": otp,
+            "sent_at": now,
+            "expires_at": now + timedelta(seconds=OTP_TTL_SECONDS),
+            "verified": False,
+        }
+        return otp
+
+    async def verify(self, phone, otp: str):
+        now = datetime.utcnow()
+        record = self.records.get(phone)
+        if not record or record["otp"] != otp or record["verified"]:
+            raise OTPInvalid()
+        if record["expires_at"] <= now:
+            raise OTPInvalid(expired=True)
+        record["verified"] = True
+        record["verified_at"] = now
+        return dict(record)
+
+
+if OTP_BACKEND == "memory":
+    _store = MemoryOTPStore()
+    _ip_limiter = RateLimiter(OTP_IP_MAX_SENDS, OTP_IP_WINDOW_SECONDS)
+else:
+    _store = MongoOTPStore()
+    _ip_limiter = MongoRateLimiter(OTP_IP_MAX_SENDS, OTP_IP_WINDOW_SECONDS)
+
+
+async def ensure_indexes():
+    await _store.ensure_indexes()
+    await _ip_limiter.ensure_indexes()
+
+
+async def issue_otp(phone, client_ip: str = None) -> str:
+    """Create (or replace) the OTP for a phone; raises OTPThrottled"""
+    if client_ip:
+        retry_after = await _ip_limiter.hit(f"ip:{client_ip}")
+        if retry_after:
+            raise OTPThrottled(retry_after)
+    return await _store.issue(phone)
+
+
+async def verify_otp(phone, otp: str) -> dict:
+    """Consume a valid OTP in one write; raises OTPInvalid"""
+    return await _store.verify(phone, otp)
@@ -0,0 +1,60 @@
+# utils/passwords.py
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.hash import bcrypt
+
+# bcrypt cost factor; each +1 doubles the time per hash (12 is ~200 ms)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# Threads doing bcrypt work; bcrypt releases the GIL, so these run in
+# parallel without blocking the event loop
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+
+_hasher = bcrypt.using(rounds=BCRYPT_ROUNDS)
+_pool = None
+
+
+def get_pool():
+    """Return the thread pool used for password hashing (created lazily)"""
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(
+            max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt"
+        )
+    return _pool
+
+
+def shutdown_pool():
+    """Shut down the hashing pool, if it was started"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def hash_password(password: str) -> str:
+    """Hash a password with the configured cost, off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pool(), _hasher.hash, password)
+
+
+async def verify_password(password: str, password_hash: str) -> bool:
+    """Check a password against a stored hash, off the event loop"""
+    if not password_hash:
+        return False
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_pool(), bcrypt.verify, password, password_hash)
+    except ValueError:
+        # Malformed or non-bcrypt hash stored for this user
+        return False
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """True when a stored hash was made with a different cost factor"""
+    try:
+        # "$2b$12$<salt+checksum>"
+        return int(password_hash.split("$")[2]) != BCRYPT_ROUNDS
+    except (AttributeError, IndexError, ValueError):
+        return True
@@ -0,0 +1,71 @@
+# utils/profileCache.py
+import os
+import time
+from collections import OrderedDict
+
+from bson import ObjectId
+from fastapi import Depends, HTTPException, Request
+
+from database import db
+from utils.jwt import get_current_user
+
+# Safety net for changes made by other workers or directly in the database
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", 60))
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", 10000))
+
+PROFILE_PROJECTION = {"password_hash": 0}
+
+_profiles = OrderedDict()  # user_id -> (expires_at, profile)
+
+
+def _serialize(user: dict) -> dict:
+    user["_id"] = str(user["_id"])
+    user.pop("password_hash", None)
+    return user
+
+
+def put(user_id: str, user: dict):
+    """Write a freshly read or updated profile through to the cache"""
+    _profiles[user_id] = (time.monotonic() + PROFILE_CACHE_TTL_SECONDS, _serialize(dict(user)))
+    _profiles.move_to_end(user_id)
+    if len(_profiles) > PROFILE_CACHE_SIZE:
+        _profiles.popitem(last=False)
+
+
+def invalidate(user_id: str):
+    """Drop a cached profile after a write this module did not see"""
+    _profiles.pop(user_id, None)
+
+
+async def get_profile(user_id: str):
+    """
+    Return the user's profile (without password_hash) or None.
+    Served from the process cache while fresh, otherwise read from Mongo.
+    """
+    entry = _profiles.get(user_id)
+    if entry is not None:
+        expires_at, profile = entry
+        if expires_at > time.monotonic():
+            _profiles.move_to_end(user_id)
+            return dict(profile)
+        del _profiles[user_id]
+
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, PROFILE_PROJECTION)
+    if not user:
+        return None
+    put(user_id, user)
+    return _serialize(user)
+
+
+async def current_profile(request: Request, user_id: str = Depends(get_current_user)):
+    """
+    Dependency: the caller's profile, loaded at most once per request.
+    Raises 404 if the user no longer exists.
+    """
+    profile = getattr(request.state, "profile", None)
+    if profile is None:
+        profile = await get_profile(user_id)
+        if not profile:
+            raise HTTPException(404, "User not found")
+        request.state.profile = profile
+    return profile
@@ -0,0 +1,96 @@
+# utils/promptCache.py
+import logging
+import os
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Rendered per-topic prompt blocks kept in memory
+TOPIC_BLOCK_CACHE_SIZE = int(os.getenv("TOPIC_BLOCK_CACHE_SIZE", 2048))
+
+# Providers only cache prompt prefixes at least this long
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+_topic_blocks = OrderedDict()
+_usage = {}
+
+
+def count_tokens(text: str, model: str):
+    """Token count with the model's tokenizer, or None if tiktoken is unavailable"""
+    try:
+        import tiktoken
+
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+        return len(encoding.encode(text))
+    except Exception:  # not installed, or its encoding files can't be fetched
+        return None
+
+
+def check_static_prefix(kind: str, prefix: str, model: str):
+    """
+    Log when a static prompt prefix is too short for provider caching.
+    A shorter prefix is simply sent uncached; it is not padded.
+    """
+    tokens = count_tokens(prefix, model)
+    if tokens is not None and tokens < PROMPT_CACHE_MIN_TOKENS:
+        logger.info(
+            f"{kind} static prompt is {tokens} tokens, below the "
+            f"{PROMPT_CACHE_MIN_TOKENS}-token caching minimum; it will not be cached"
+        )
+
+
+def topic_block(kind: str, topic: dict, render) -> str:
+    """
+    Return the rendered topic block for a topic, rendering it once per topic_id.
+    Keeping this text byte-identical between requests lets the provider's
+    automatic prefix caching reuse it.
+    """
+    key = (kind, topic.get("topic_id"))
+    block = _topic_blocks.get(key)
+    if block is not None:
+        _topic_blocks.move_to_end(key)
+        return block
+
+    block = render(topic)
+    _topic_blocks[key] = block
+    if len(_topic_blocks) > TOPIC_BLOCK_CACHE_SIZE:
+        _topic_blocks.popitem(last=False)
+    return block
+
+
+def record_usage(kind: str, usage) -> float:
+    """Track prompt vs cached prompt tokens for an LLM call; returns the cached ratio"""
+    if usage is None:
+        return 0.0
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+
+    stats = _usage.setdefault(
+        kind, {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0}
+    )
+    stats["requests"] += 1
+    stats["prompt_tokens"] += prompt_tokens
+    stats["cached_tokens"] += cached_tokens
+
+    ratio = cached_tokens / prompt_tokens if prompt_tokens else 0.0
+    logger.info(
+        f"{kind} prompt: {prompt_tokens} tokens, {cached_tokens} cached ({ratio:.0%})"
+    )
+    return ratio
+
+
+def usage_stats() -> dict:
+    """Cached-token ratios per evaluation kind since process start"""
+    return {
+        kind: {
+            **stats,
+            "cached_ratio": round(stats["cached_tokens"] / stats["prompt_tokens"], 4)
+            if stats["prompt_tokens"]
+            else 0.0,
+        }
+        for kind, stats in _usage.items()
+    }
@@ -0,0 +1,45 @@
+# utils/spacedRepetition.py
+from datetime import datetime, timedelta
+
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+
+
+def new_card() -> dict:
+    return {"ease": INITIAL_EASE, "interval_days": 0, "repetitions": 0, "lapses": 0}
+
+
+def schedule(card: dict, quality: int, now: datetime = None) -> dict:
+    """
+    SM-2: return the card's new scheduling state after a review graded
+    0 (blackout) to 5 (perfect). Grades below 3 restart the card tomorrow.
+    """
+    now = now or datetime.utcnow()
+    ease = card.get("ease", INITIAL_EASE)
+    interval = card.get("interval_days", 0)
+    repetitions = card.get("repetitions", 0)
+    lapses = card.get("lapses", 0)
+
+    if quality < 3:
+        repetitions = 0
+        interval = 1
+        lapses += 1
+    else:
+        repetitions += 1
+        if repetitions == 1:
+            interval = 1
+        elif repetitions == 2:
+            interval = 6
+        else:
+            interval = round(interval * ease)
+
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return {
+        "ease": round(ease, 3),
+        "interval_days": interval,
+        "repetitions": repetitions,
+        "lapses": lapses,
+        "last_quality": quality,
+        "last_reviewed_at": now,
+        "due_at": now + timedelta(days=interval),
+    }
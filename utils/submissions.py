@@ -0,0 +1,120 @@
+# utils/submissions.py
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from database import db
+
+# evaluation collection -> (catalog collection, id field shared by both)
+SOURCES = {
+    "reading_evaluations": ("reading_passages", "passage_id"),
+    "writing_evaluations": ("writing_topics", "topic_id"),
+    "speaking_evaluations": ("speaking_topics", "topic_id"),
+}
+
+
+class InvalidCursor(ValueError):
+    """Raised for a malformed submissions paging cursor"""
+
+
+async def ensure_indexes():
+    """History pages are a range scan on (user_id, submitted_at, _id)"""
+    for collection in SOURCES:
+        await db[collection].create_index(
+            [("user_id", 1), ("submitted_at", -1), ("_id", -1)]
+        )
+
+
+def encode_cursor(submission: dict) -> str:
+    return f"{submission['submitted_at'].isoformat()}_{submission['_id']}"
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Filter for submissions strictly older than the cursor's position"""
+    try:
+        submitted_at, _id = cursor.rsplit("_", 1)
+        submitted_at, _id = datetime.fromisoformat(submitted_at), ObjectId(_id)
+    except (ValueError, InvalidId):
+        raise InvalidCursor("Invalid cursor")
+    return {
+        "$or": [
+            {"submitted_at": {"$lt": submitted_at}},
+            {"submitted_at": submitted_at, "_id": {"$lt": _id}},
+        ]
+    }
+
+
+async def list_submissions(collection: str, user_id: str, cursor: str = None,
+                           limit: int = 20) -> dict:
+    """
+    One page of a user's submissions, newest first, with summary fields only.
+    Titles are stored on the submission at write time; older submissions
+    without one get it from a $lookup limited to the page.
+    """
+    catalog, id_field = SOURCES[collection]
+    match = {"user_id": user_id}
+    if cursor:
+        match.update(decode_cursor(cursor))
+
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"submitted_at": -1, "_id": -1}},
+        {"$limit": limit + 1},
+        {
+            "$lookup": {
+                "from": catalog,
+                "let": {"item_id": f"${id_field}", "title": "$title"},
+                "pipeline": [
+                    {
+                        "$match": {
+                            "$expr": {
+                                "$and": [
+                                    {"$eq": [{"$ifNull": ["$$title", None]}, None]},
+                                    {"$eq": [f"${id_field}", "$$item_id"]},
+                                ]
+                            }
+                        }
+                    },
+                    {"$project": {"_id": 0, "title": 1}},
+                ],
+                "as": "catalog",
+            }
+        },
+        {
+            "$project": {
+                id_field: 1,
+                "submitted_at": 1,
+                "overall_score": "$evaluation_data.overall_score",
+                "title": {
+                    "$ifNull": [
+                        "$title",
+                        {"$ifNull": [{"$arrayElemAt": ["$catalog.title", 0]}, "Unknown Title"]},
+                    ]
+                },
+            }
+        },
+    ]
+    submissions = await db[collection].aggregate(pipeline).to_list(limit + 1)
+
+    next_cursor = None
+    if len(submissions) > limit:
+        submissions = submissions[:limit]
+        next_cursor = encode_cursor(submissions[-1])
+    for submission in submissions:
+        submission["submission_id"] = str(submission.pop("_id"))
+    return {"results": submissions, "next_cursor": next_cursor}
+
+
+async def get_submission(collection: str, user_id: str, submission_id: str):
+    """Full stored submission (evaluation_data included), or None"""
+    try:
+        _id = ObjectId(submission_id)
+    except InvalidId:
+        return None
+    submission = await db[collection].find_one(
+        {"_id": _id, "user_id": user_id}, {"user_id": 0}
+    )
+    if submission:
+        submission["submission_id"] = str(submission.pop("_id"))
+    return submission
@@ -0,0 +1,392 @@
+# utils/vectorIndex.py
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from utils.allFunctions import AllFunctions, embedding_tag
+from utils.mmapMatrix import MmapMatrix, append_lines
+
+logger = logging.getLogger(__name__)
+
+# Where the memory-mapped vector files live (shared by every worker process)
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "cache/vector_index")
+# float32 keeps full precision; int8 quarters the memory for a small recall cost
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float32")
+# Rows scored per block when the matrix is int8 (bounds the float32 scratch space)
+INT8_BLOCK_ROWS = 16384
+
+# What to embed for each catalog collection
+CATALOGS = {
+    "reading_passages": {
+        "id_field": "passage_id",
+        "text": lambda doc: f"{doc.get('title', '')}\n{doc.get('passage', '')[:1000]}",
+    },
+    "writing_topics": {
+        "id_field": "topic_id",
+        "text": lambda doc: f"{doc.get('title', '')}\n{doc.get('description', '')}",
+    },
+    "speaking_topics": {
+        "id_field": "topic_id",
+        "text": lambda doc: f"{doc.get('title', '')}\n{doc.get('description', '')}",
+    },
+}
+
+
+class VectorIndex:
+    """
+    In-process top-k cosine index over normalized embeddings.
+    Vectors live in a memory-mapped file and per-row metadata (id, row,
+    level, difficulty) in an append-only JSONL file next to it, written
+    after the vector so a crash in between only leaves an unreferenced row.
+    """
+
+    def __init__(self, name: str, directory: str = None, dtype: str = None):
+        directory = directory or VECTOR_INDEX_DIR
+        os.makedirs(directory, exist_ok=True)
+        self.dtype = dtype or VECTOR_INDEX_DTYPE
+        self.meta_path = os.path.join(directory, f"{name}.{self.dtype}.meta.jsonl")
+        self.lock_path = os.path.join(directory, f"{name}.{self.dtype}.lock")
+        self.matrix = MmapMatrix(
+            os.path.join(directory, f"{name}.{self.dtype}.vec"), self.dtype
+        )
+        self.dim = None
+        # Per-row arrays indexed by matrix row, with spare capacity. Rows are
+        # only ever appended, so the first `_size` entries never change and
+        # search() can use views of them without copying.
+        self._size = 0
+        self._ids = np.empty(0, dtype=object)
+        self._levels = np.empty(0, dtype=object)
+        self._difficulties = np.empty(0, dtype=object)
+        self._valid = np.empty(0, dtype=bool)  # False for unreferenced rows
+        self.rows = {}
+        self._meta_offset = 0
+        self._meta_lines = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self.rows)
+
+    def __contains__(self, item_id):
+        with self._lock:
+            self._refresh()
+            return item_id in self.rows
+
+    def missing(self, item_ids) -> list:
+        """The ids that are not indexed yet, in order"""
+        with self._lock:
+            self._refresh()
+            return [item_id for item_id in item_ids if item_id not in self.rows]
+
+    def refresh(self):
+        """Pick up rows appended by this or another process"""
+        with self._lock:
+            self._refresh()
+
+    def _grow(self, size: int):
+        capacity = max(size, 2 * len(self._ids), 1024)
+        for name, dtype, fill in (
+            ("_ids", object, None),
+            ("_levels", object, None),
+            ("_difficulties", object, None),
+            ("_valid", bool, False),
+        ):
+            old = getattr(self, name)
+            grown = np.full(capacity, fill, dtype=dtype)
+            grown[: self._size] = old[: self._size]
+            setattr(self, name, grown)
+
+    def _refresh(self):
+        # Caller holds self._lock
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            f.seek(self._meta_offset)
+            lines = f.readlines()
+            # Only consume complete lines; a writer may be mid-append
+            complete = [line for line in lines if line.endswith("\n")]
+            self._meta_offset += sum(len(line.encode("utf-8")) for line in complete)
+
+        if not complete:
+            return
+        entries = []
+        for line in complete:
+            entry = json.loads(line)
+            # Entries written before row numbers were stored are sequential
+            entry.setdefault("row", self._meta_lines)
+            self._meta_lines += 1
+            entries.append(entry)
+        self.dim = entries[0]["dim"]
+
+        size = max(self._size, max(entry["row"] for entry in entries) + 1)
+        if size > len(self._ids):
+            self._grow(size)
+        for entry in entries:
+            row = entry["row"]
+            self._ids[row] = entry["id"]
+            self._levels[row] = entry.get("level")
+            self._difficulties[row] = entry.get("difficulty")
+            self._valid[row] = True
+            self.rows[entry["id"]] = row
+        self._size = size
+
+    def _snapshot(self):
+        """Refresh and return consistent views (ids, levels, difficulties, valid, rows, matrix)"""
+        with self._lock:
+            self._refresh()
+            if not self.rows:
+                return None
+            matrix = self.matrix.view(self.dim)
+            count = min(self._size, matrix.shape[0])
+            return (
+                self._ids[:count],
+                self._levels[:count],
+                self._difficulties[:count],
+                self._valid[:count],
+                self.rows,
+                matrix[:count],
+            )
+
+    def add(self, item_id: str, vector, level=None, difficulty=None):
+        """Append one normalized vector unless the id is already indexed"""
+        self.add_many([(item_id, vector, level, difficulty)])
+
+    def add_many(self, items: list):
+        """
+        Append (id, vector, level, difficulty) items that are not indexed yet,
+        writing all vectors and metadata lines under one lock.
+        """
+        with self._lock, open(self.lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                new, seen = [], set()
+                for item in items:
+                    if item[0] not in self.rows and item[0] not in seen:
+                        seen.add(item[0])
+                        new.append(item)
+                if not new:
+                    return
+                vectors = np.stack(
+                    [np.asarray(item[1], dtype=np.float32).reshape(-1) for item in new]
+                )
+                start = self.matrix.append(self._encode(vectors))
+                append_lines(
+                    self.meta_path,
+                    "".join(
+                        json.dumps(
+                            {
+                                "id": item_id,
+                                "row": start + n,
+                                "level": level,
+                                "difficulty": difficulty,
+                                "dim": vectors.shape[1],
+                            }
+                        )
+                        + "\n"
+                        for n, (item_id, _, level, difficulty) in enumerate(new)
+                    ),
+                )
+                self._refresh()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def vector(self, item_id: str):
+        """Return the stored vector for an id as float32, or None"""
+        snapshot = self._snapshot()
+        if snapshot is None:
+            return None
+        _, _, _, _, rows, matrix = snapshot
+        row = rows.get(item_id)
+        if row is None or row >= matrix.shape[0]:
+            return None
+        return self._decode(matrix[row : row + 1])[0]
+
+    def search(self, vector, k: int = 10, level=None, difficulty=None, exclude_id=None):
+        """Return [(id, score)] of the k most similar rows matching the filters"""
+        snapshot = self._snapshot()
+        if snapshot is None:
+            return []
+        ids, levels, difficulties, valid, rows, matrix = snapshot
+
+        query = np.asarray(vector, dtype=np.float32)
+        scores = self._scores(matrix, query)
+
+        mask = valid.copy()
+        if level:
+            mask &= levels == level
+        if difficulty:
+            mask &= difficulties == difficulty
+        row = rows.get(exclude_id)
+        if row is not None and row < len(mask):
+            mask[row] = False
+        scores[~mask] = -np.inf
+
+        available = int(mask.sum())
+        if available == 0:
+            return []
+        k = min(k, available)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(ids[i], float(scores[i])) for i in top]
+
+    def _scores(self, matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+        if self.dtype != "int8":
+            return np.asarray(matrix @ query, dtype=np.float32)
+        scores = np.empty(matrix.shape[0], dtype=np.float32)
+        for start in range(0, matrix.shape[0], INT8_BLOCK_ROWS):
+            block = matrix[start : start + INT8_BLOCK_ROWS].astype(np.float32)
+            scores[start : start + len(block)] = block @ query
+        return scores / 127.0
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        if self.dtype == "int8":
+            # Normalized vectors lie in [-1, 1], so one fixed scale is enough
+            return np.clip(np.round(vectors * 127.0), -127, 127).astype(np.int8)
+        return vectors.astype(np.float32)
+
+    def _decode(self, rows: np.ndarray) -> np.ndarray:
+        if self.dtype == "int8":
+            return rows.astype(np.float32) / 127.0
+        return np.asarray(rows, dtype=np.float32)
+
+
+_indexes = {}
+
+
+def get_index(collection: str) -> VectorIndex:
+    """Return the shared index for a catalog collection"""
+    if collection not in _indexes:
+        # Keyed by model/backend so switching either starts a fresh index
+        name = re.sub(r"[^\w.-]", "_", f"{collection}.{embedding_tag()}")
+        _indexes[collection] = VectorIndex(name)
+    return _indexes[collection]
+
+
+def index_document(collection: str, doc: dict):
+    """Embed a catalog document and add it to its index (blocking)"""
+    index_documents(collection, [doc])
+
+
+def index_in_background(collection: str, doc: dict):
+    """BackgroundTasks entry point: log a failure instead of skipping later tasks"""
+    try:
+        index_document(collection, doc)
+    except Exception as e:
+        logger.error(f"Failed to index {collection} document: {str(e)}")
+
+
+def index_documents(collection: str, docs: list):
+    """Embed catalog documents in one batch and add the new ones to the index"""
+    catalog = CATALOGS[collection]
+    index = get_index(collection)
+    missing = set(index.missing([doc[catalog["id_field"]] for doc in docs]))
+    docs = [doc for doc in docs if doc[catalog["id_field"]] in missing]
+    if not docs:
+        return
+    vectors = AllFunctions().embed_many([catalog["text"](doc) for doc in docs])
+    index.add_many(
+        [
+            (doc[catalog["id_field"]], vector, doc.get("level"), doc.get("difficulty"))
+            for doc, vector in zip(docs, vectors)
+        ]
+    )
+
+
+def similar(collection: str, item_id: str, k: int, level=None, difficulty=None):
+    """Top-k similar ids for an indexed item, or None if it is not indexed"""
+    index = get_index(collection)
+    vector = index.vector(item_id)
+    if vector is None:
+        return None
+    return index.search(vector, k, level, difficulty, exclude_id=item_id)
+
+
+async def similar_documents(db, collection: str, item_id: str, k: int, level=None,
+                            difficulty=None):
+    """
+    Top-k similar catalog documents (summary fields plus `score`), most
+    similar first. Returns None if the item is not indexed.
+    """
+    from fastapi.concurrency import run_in_threadpool
+
+    matches = await run_in_threadpool(similar, collection, item_id, k, level, difficulty)
+    if matches is None:
+        return None
+
+    id_field = CATALOGS[collection]["id_field"]
+    scores = dict(matches)
+    docs = await db[collection].find(
+        {id_field: {"$in": list(scores)}},
+        {"_id": 0, id_field: 1, "title": 1, "level": 1, "difficulty": 1},
+    ).to_list(None)
+    for doc in docs:
+        doc["score"] = round(scores[doc[id_field]], 4)
+    return sorted(docs, key=lambda doc: doc["score"], reverse=True)
+
+
+async def backfill(db, batch_size: int = 64):
+    """Index catalog documents that were inserted before the index existed"""
+    from fastapi.concurrency import run_in_threadpool
+
+    for collection, catalog in CATALOGS.items():
+        id_field = catalog["id_field"]
+        cursor = db[collection].find(
+            {}, {"_id": 0, id_field: 1, "title": 1, "description": 1,
+                 "passage": 1, "level": 1, "difficulty": 1}
+        )
+        pending = []
+        async for doc in cursor:
+            # index_documents skips ids that are already indexed
+            if doc.get(id_field):
+                pending.append(doc)
+            if len(pending) >= batch_size:
+                await run_in_threadpool(index_documents, collection, pending)
+                pending = []
+        if pending:
+            await run_in_threadpool(index_documents, collection, pending)
+
+
+async def backfill_once(db):
+    """
+    Run backfill from one worker per host, once per embedding model/backend.
+    Workers share the index files, so the first to take the directory's
+    backfill lock does the work and the others skip it; a marker file
+    records completion. Rerun by hand with `python -m utils.vectorIndex`.
+    """
+    directory = VECTOR_INDEX_DIR
+    os.makedirs(directory, exist_ok=True)
+    tag = re.sub(r"[^\w.-]", "_", embedding_tag())
+    marker = os.path.join(directory, f"backfill.{tag}.done")
+    if os.path.exists(marker):
+        return
+    with open(os.path.join(directory, "backfill.lock"), "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return  # another worker is backfilling
+        try:
+            if os.path.exists(marker):
+                return
+            await backfill(db)
+            with open(marker, "w") as f:
+                f.write(f"{time.time()}\n")
+            logger.info(f"Vector index backfill finished for {tag}")
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+if __name__ == "__main__":
+    import asyncio
+
+    from database import db
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(backfill(db))
@@ -0,0 +1,121 @@
+# utils/vocabularyIndex.py
+import asyncio
+import bisect
+import logging
+
+from utils import contentVersion
+
+logger = logging.getLogger(__name__)
+
+ALL_STANDARDS = None
+
+
+class PrefixIndex:
+    """
+    Sorted array of lowercased words for prefix lookups.
+    A search is one bisect plus a scan over the matches it returns.
+    Each word appears once, even if several standards define it.
+    """
+
+    def __init__(self):
+        self.keys = []  # lowercased words, sorted
+        self.entries = []  # (word, meaning), parallel to keys
+
+    def add(self, word: str, meaning: str):
+        key = word.lower()
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return
+        self.keys.insert(i, key)
+        self.entries.insert(i, (word, meaning))
+
+    def search(self, prefix: str, limit: int) -> list:
+        prefix = prefix.lower()
+        results = []
+        i = bisect.bisect_left(self.keys, prefix)
+        while i < len(self.keys) and len(results) < limit and self.keys[i].startswith(prefix):
+            word, meaning = self.entries[i]
+            results.append({"word": word, "meaning": meaning})
+            i += 1
+        return results
+
+
+# standard -> PrefixIndex, plus ALL_STANDARDS for unfiltered search
+_indexes = {ALL_STANDARDS: PrefixIndex()}
+_seen_ids = set()
+# contentVersion counter for "vocabulary" the index was built at; other
+# workers' inserts bump it, and the next search here rebuilds
+_loaded_version = None
+_reload_lock = None  # created on first use, inside the event loop
+
+
+def add(words: list):
+    """Index vocabulary entries as they are inserted"""
+    for doc in words:
+        word = (doc.get("word") or "").strip()
+        if not word:
+            continue
+        entry_id = doc.get("id") or doc.get("_id")
+        if entry_id is not None:
+            if entry_id in _seen_ids:
+                continue
+            _seen_ids.add(entry_id)
+        meaning = doc.get("meaning")
+        _indexes[ALL_STANDARDS].add(word, meaning)
+        standard = doc.get("standard")
+        if standard is not None:
+            _indexes.setdefault(standard, PrefixIndex()).add(word, meaning)
+
+
+async def load(db):
+    """(Re)build the index from the vocabulary collection"""
+    global _indexes, _seen_ids, _loaded_version
+    # Read the counter first so a bump during the load triggers another one
+    version = (await contentVersion.get_versions(["vocabulary"]))["vocabulary"]
+    words = await db.vocabulary.find(
+        {}, {"_id": 0, "id": 1, "standard": 1, "word": 1, "meaning": 1}
+    ).to_list(None)
+    # Sort once and append, rather than a sorted insert per word
+    words.sort(key=lambda doc: (doc.get("word") or "").strip().lower())
+
+    indexes, seen_ids = {ALL_STANDARDS: PrefixIndex()}, set()
+    for doc in words:
+        word = (doc.get("word") or "").strip()
+        if not word or doc.get("id") in seen_ids:
+            continue
+        if doc.get("id") is not None:
+            seen_ids.add(doc["id"])
+        standards = [ALL_STANDARDS]
+        if doc.get("standard") is not None:
+            standards.append(doc["standard"])
+        for standard in standards:
+            index = indexes.setdefault(standard, PrefixIndex())
+            if index.keys and index.keys[-1] == word.lower():
+                continue  # same word from another standard or entry
+            index.keys.append(word.lower())
+            index.entries.append((word, doc.get("meaning")))
+
+    _indexes, _seen_ids, _loaded_version = indexes, seen_ids, version
+    logger.info(f"Loaded vocabulary index with {len(indexes[ALL_STANDARDS].keys)} words")
+
+
+async def refresh(db):
+    """Rebuild the index if vocabulary changed since it was loaded (any worker)"""
+    global _reload_lock
+    version = (await contentVersion.get_versions(["vocabulary"]))["vocabulary"]
+    if version == _loaded_version:
+        return
+    if _reload_lock is None:
+        _reload_lock = asyncio.Lock()
+    async with _reload_lock:
+        version = (await contentVersion.get_versions(["vocabulary"]))["vocabulary"]
+        if version != _loaded_version:
+            await load(db)
+
+
+def search(prefix: str, standard=None, limit: int = 10) -> list:
+    """Words starting with `prefix` (case-insensitive), alphabetically"""
+    index = _indexes.get(standard)
+    if index is None:
+        return []
+    return index.search(prefix.strip(), limit)